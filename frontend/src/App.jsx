@@ -1,78 +1,90 @@
 import React, { useState } from "react";
 
+const HAZARDS = {
+  cyclone: { label: "🌪️ Cyclone", cols: 6 },
+  earthquake: { label: "🌋 Earthquake", cols: 129 },
+};
+
 function App() {
-  const [hazardType, setHazardType] = useState("cyclone");
-  const [inputData, setInputData] = useState("");
-  const [result, setResult] = useState("");
+  const [inputs, setInputs] = useState({ cyclone: "", earthquake: "" });
+  const [result, setResult] = useState([]);
   const [loading, setLoading] = useState(false);
   const [probability, setProbability] = useState(null);
 
-  const handleHazardChange = (e) => {
-    setHazardType(e.target.value);
-    setInputData("");
-    setResult("");
-    setProbability(null);
-  };
-
-  const handleInputChange = (e) => setInputData(e.target.value);
+  const handleInputChange = (hazard) => (e) =>
+    setInputs({ ...inputs, [hazard]: e.target.value });
 
-  const validateInputShape = (data) => {
+  const validateInputShape = (data, hazard) => {
     if (!Array.isArray(data) || data.length < 1) return false;
     if (!Array.isArray(data[0])) data = [data];
     const rows = data.length;
     const cols = data[0].length;
     let expectedRows = 64;
-    let expectedCols = hazardType === "cyclone" ? 6 : 129;
+    let expectedCols = HAZARDS[hazard].cols;
     if (cols !== expectedCols) return false;
     if (rows !== 1 && rows !== expectedRows) return false;
     return true;
   };
 
   const handlePredict = async () => {
-    setResult("");
+    setResult([]);
     setProbability(null);
-    let data;
-    try {
-      data = JSON.parse(inputData);
-    } catch {
-      alert("Invalid JSON format");
-      return;
+
+    // Both hazards go in one /predict/all request; empty inputs are left out
+    const body = {};
+    for (const hazard of Object.keys(HAZARDS)) {
+      if (!inputs[hazard].trim()) continue;
+      let data;
+      try {
+        data = JSON.parse(inputs[hazard]);
+      } catch {
+        alert(`Invalid JSON format for ${hazard.toUpperCase()} input`);
+        return;
+      }
+      if (!validateInputShape(data, hazard)) {
+        alert(
+          `Invalid input shape for ${hazard.toUpperCase()} input. Columns must be exactly ${HAZARDS[hazard].cols}, and rows must be 1 or 64.`
+        );
+        return;
+      }
+      body[hazard] = data;
     }
-    if (!validateInputShape(data)) {
-      const expectedCols = hazardType === "cyclone" ? 6 : 129;
-      alert(
-        `Invalid input shape for ${hazardType.toUpperCase()} input. Columns must be exactly ${expectedCols}, and rows must be 1 or 64.`
-      );
+    if (Object.keys(body).length === 0) {
+      alert("Enter a cyclone or earthquake input (or both)");
       return;
     }
 
     setLoading(true);
     try {
       const backendIP = "192.168.1.2"; // your Flask server IP
-      const endpoint =
-        hazardType === "cyclone"
-          ? `http://${backendIP}:5000/predict/cyclone`
-          : `http://${backendIP}:5000/predict/earthquake`;
-
-      const response = await fetch(endpoint, {
+      const response = await fetch(`http://${backendIP}:5000/predict/all`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ spectrogram: data }),
+        body: JSON.stringify(body),
       });
 
-      if (!response.ok) throw new Error(`Server error: ${response.status}`);
       const resData = await response.json();
-      const prob = resData.probability;
-      setProbability(prob);
-      setResult(
-        prob !== undefined
-          ? `Prediction Probability: ${Number(prob).toFixed(4)}`
-          : resData.error
-          ? `Server error: ${resData.error}`
-          : "Unknown error or response"
-      );
+      // A model failing comes back as an `error` entry under its hazard
+      // (status 200, or 500 when every model failed); a top-level error
+      // means the request itself was rejected
+      if (resData.error) throw new Error(resData.error);
+      if (!response.ok && !Object.keys(body).some((hazard) => resData[hazard]))
+        throw new Error(`Server error: ${response.status}`);
+
+      const lines = Object.keys(body).map((hazard) => {
+        const r = resData[hazard] || {};
+        return r.probability !== undefined
+          ? `${HAZARDS[hazard].label}: ${Number(r.probability).toFixed(4)} (${Math.round(r.latency_ms)} ms)`
+          : `${HAZARDS[hazard].label}: ${r.error ? `Server error: ${r.error}` : "Unknown error or response"}`;
+      });
+      const probs = Object.keys(body)
+        .map((hazard) => resData[hazard] && resData[hazard].probability)
+        .filter((p) => p !== undefined);
+      // The highest hazard probability drives the alert colours
+      setProbability(probs.length ? Math.max(...probs) : null);
+      setResult(lines);
     } catch (err) {
-      setResult(`Error: ${err.message}`);
+      setResult([`Error: ${err.message}`]);
     } finally {
       setLoading(false);
     }
@@ -109,35 +121,22 @@ function App() {
         </p>
 
         <div className="bg-white/10 backdrop-blur-xl rounded-3xl shadow-2xl border border-white/20 w-full max-w-4xl p-10 space-y-8">
-          {/* Hazard Type Selector */}
-          <div>
-            <label className="block text-lg font-semibold mb-2">
-              Select Hazard Type:
-            </label>
-            <select
-              value={hazardType}
-              onChange={handleHazardChange}
-              className="p-3 rounded-lg bg-gray-900 border border-gray-600 focus:ring-2 focus:ring-blue-400 w-64 text-center"
-            >
-              <option value="cyclone">🌪️ Cyclone (64×6)</option>
-              <option value="earthquake">🌋 Earthquake (64×129)</option>
-            </select>
-          </div>
-
-          {/* Input Area */}
-          <div>
-            <label htmlFor="input-data" className="block mb-2 font-medium">
-              Enter your 2D array JSON:
-            </label>
-            <textarea
-              id="input-data"
-              value={inputData}
-              onChange={handleInputChange}
-              rows={10}
-              placeholder={`Paste your ${hazardType} input JSON here`}
-              className="bg-gray-900/70 border border-gray-600 rounded-xl p-3 text-sm w-full font-mono focus:ring-2 focus:ring-blue-400"
-            />
-          </div>
+          {/* Input Areas: either or both hazards, scored in one request */}
+          {Object.entries(HAZARDS).map(([hazard, { label, cols }]) => (
+            <div key={hazard}>
+              <label htmlFor={`input-${hazard}`} className="block mb-2 font-medium">
+                {label} (64×{cols}) 2D array JSON:
+              </label>
+              <textarea
+                id={`input-${hazard}`}
+                value={inputs[hazard]}
+                onChange={handleInputChange(hazard)}
+                rows={6}
+                placeholder={`Paste your ${hazard} input JSON here (optional)`}
+                className="bg-gray-900/70 border border-gray-600 rounded-xl p-3 text-sm w-full font-mono focus:ring-2 focus:ring-blue-400"
+              />
+            </div>
+          ))}
 
           {/* Predict Button */}
           <div className="flex justify-center">
@@ -166,25 +165,20 @@ function App() {
           </div>
 
           {/* Result Display */}
-          <div className="text-center text-xl font-semibold text-yellow-300">
-            {result}
+          <div className="text-center text-xl font-semibold text-yellow-300 space-y-1">
+            {result.map((line) => (
+              <div key={line}>{line}</div>
+            ))}
           </div>
 
           {/* Example Format */}
           <div className="text-sm text-gray-300 whitespace-pre-wrap text-center">
-            <b>Example input format for {hazardType}:</b>
+            <b>Example input format:</b>
             <br />
-            {hazardType === "cyclone" ? (
-              <>
-                [ [0.6, 0.4, 0.3, 0.2, 0.1, 0.0], ... ]
-                {"\n(or a single row: [0.6, 0.4, 0.3, 0.2, 0.1, 0.0])"}
-              </>
-            ) : (
-              <>
-                [ [0.01, 0.02, ..., 0.12, ..., 0.15], ... ]
-                {"\n(or a single row with 129 values)"}
-              </>
-            )}
+            cyclone: [ [0.6, 0.4, 0.3, 0.2, 0.1, 0.0], ... ]
+            {"\n(or a single row: [0.6, 0.4, 0.3, 0.2, 0.1, 0.0])"}
+            {"\n\n"}earthquake: [ [0.01, 0.02, ..., 0.12, ..., 0.15], ... ]
+            {"\n(or a single row with 129 values)"}
           </div>
         </div>
       </main>
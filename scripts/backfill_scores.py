@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from hashing import file_hash
+from spectrogram_store import SpectrogramStore
+from windowing import WINDOW_SIZE, spectrogram_windows, model_layout
+
+# Offline scorer: runs a seismic model over every 64-column window of
+# memory-mapped spectrograms (or a spectrogram store) and writes one
+# probability per window to disk.
+#
+# Each source gets <out>/<name>.npy (float32 probabilities, written in place
+# through open_memmap) and <name>.json with its timing and a checkpoint. The
+# checkpoint is only advanced after the scores before it are flushed, so an
+# interrupted run resumes where it stopped; a different model file starts the
+# source over.
+#
+# Usage (from the repo root):
+#   python scripts/backfill_scores.py --store data/seismic/store --start 2024-01-01 --end 2025-01-01
+#   python scripts/backfill_scores.py --spectrograms data/seismic/spectrogram.npy
+
+DEFAULT_MODEL = 'models/seismic_best_gru.h5'
+DEFAULT_OUT = 'data/seismic/scores'
+
+
+def configure_threads(threads):
+    # Must run before TensorFlow executes its first op
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(max(1, threads // 4))
+
+
+def list_sources(args):
+    # (name, start_time, dt, (freq, time) spectrogram) per source; times are
+    # None for plain .npy files
+    if not args.store:
+        return [(os.path.splitext(os.path.basename(path))[0], None, None, np.load(path, mmap_mode='r'))
+                for path in args.spectrograms]
+
+    store = SpectrogramStore(args.store)
+    sources = []
+    for station in args.stations or store.stations():
+        for dt, start, spec in store.pieces(station, args.start, args.end):
+            sources.append((os.path.join(station, f"{start:.6f}"), start, dt, spec))
+    return sources
+
+
+def load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def save_checkpoint(checkpoint, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def score_source(engine, windows, scores, checkpoint, checkpoint_path, batch_size, checkpoint_every):
+    # Gathers the next batch from the memory map on a background thread while
+    # the current one runs through the model
+    n = len(windows)
+    start = checkpoint['next_index']
+    batches = list(range(start, n, batch_size))
+    if not batches:
+        return 0
+
+    def gather(first):
+        return np.ascontiguousarray(windows[first:first + batch_size], np.float32)
+
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        pending = reader.submit(gather, batches[0])
+        for i, first in enumerate(batches):
+            batch = pending.result()
+            if i + 1 < len(batches):
+                pending = reader.submit(gather, batches[i + 1])
+
+            scores[first:first + len(batch)] = engine.predict(batch).reshape(len(batch), -1)[:, 0]
+
+            if (i + 1) % checkpoint_every == 0 or i + 1 == len(batches):
+                scores.flush()
+                checkpoint['next_index'] = first + len(batch)
+                save_checkpoint(checkpoint, checkpoint_path)
+    return n - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score every window of a spectrogram archive with a seismic model')
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--spectrograms', nargs='+', default=['data/seismic/spectrogram.npy'],
+                        help='Spectrogram .npy files to score')
+    parser.add_argument('--store', help='Score a spectrogram store instead of --spectrograms')
+    parser.add_argument('--stations', nargs='+', help='Store stations to score (default: all)')
+    parser.add_argument('--start', help='Start of the store time range (epoch seconds or ISO-8601)')
+    parser.add_argument('--end', help='End of the store time range (epoch seconds or ISO-8601)')
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--checkpoint-every', type=int, default=16, help='Batches between checkpoints')
+    parser.add_argument('--threads', type=int, default=os.cpu_count(), help='TensorFlow intra-op threads')
+    args = parser.parse_args()
+
+    configure_threads(args.threads)
+    import tensorflow as tf
+    from inference_engine import InferenceEngine
+
+    model_hash = file_hash(args.model)
+    sources = list_sources(args)
+    print(f"Scoring {len(sources)} sources with {args.model}")
+
+    model = tf.keras.models.load_model(args.model, compile=False)
+    layout = model_layout(model.input_shape)
+
+    engine = None
+    started, scored = time.time(), 0
+    for name, start_time, dt, spec in sources:
+        if spec.shape[1] <= WINDOW_SIZE:
+            continue
+        if engine is None:
+            input_shape = (spec.shape[0], WINDOW_SIZE, 1) if layout == 'cnn' else (WINDOW_SIZE, spec.shape[0])
+            engine = InferenceEngine(model, input_shape, warmup_batch_sizes=(args.batch_size,))
+
+        windows = spectrogram_windows(spec, WINDOW_SIZE, layout)
+        scores_path = os.path.join(args.out, name + '.npy')
+        checkpoint_path = os.path.join(args.out, name + '.json')
+        os.makedirs(os.path.dirname(scores_path), exist_ok=True)
+
+        checkpoint = load_checkpoint(checkpoint_path)
+        if (checkpoint is None or checkpoint['model_hash'] != model_hash
+                or checkpoint['windows'] != len(windows) or not os.path.exists(scores_path)):
+            checkpoint = {
+                'model': args.model,
+                'model_hash': model_hash,
+                'windows': len(windows),
+                'window_size': WINDOW_SIZE,
+                # Score i is for the window centred on column i + window_size // 2
+                'first_time': None if start_time is None else start_time + (WINDOW_SIZE // 2) * dt,
+                'dt': dt,
+                'next_index': 0,
+            }
+            scores = np.lib.format.open_memmap(scores_path, mode='w+', dtype=np.float32, shape=(len(windows),))
+            save_checkpoint(checkpoint, checkpoint_path)
+        else:
+            scores = np.lib.format.open_memmap(scores_path, mode='r+')
+
+        done = score_source(engine, windows, scores, checkpoint, checkpoint_path,
+                            args.batch_size, args.checkpoint_every)
+        scored += done
+        del scores
+        print(f"{name}: {done} windows scored ({len(windows)} total)")
+
+    elapsed = time.time() - started
+    print(f"Done: {scored} windows in {elapsed:.1f}s ({scored / max(elapsed, 1e-9):.0f} windows/s) -> {args.out}")
+
+
+if __name__ == '__main__':
+    main()
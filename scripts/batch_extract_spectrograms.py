@@ -0,0 +1,146 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from scipy.signal import spectrogram
+
+from hashing import file_hash
+from spectrogram_store import SpectrogramStore, DEFAULT_STORE
+from streaming_spectrogram import SEGMENT_LENGTH, OVERLAP, LOG_EPSILON
+
+# Headless batch version of extract_spectrogram.py: computes the normalised
+# log-spectrogram of every trace in every waveform file and appends it to a
+# spectrogram store. A manifest of content hashes lets nightly reruns skip
+# files that were already processed.
+#
+# Usage (from the repo root):
+#   python scripts/batch_extract_spectrograms.py data/seismic/archive/ 'data/seismic/*.mseed'
+
+
+def list_files(inputs):
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for dirpath, dirnames, filenames in os.walk(pattern):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+                paths.extend(os.path.join(dirpath, name) for name in sorted(filenames) if not name.startswith('.'))
+        else:
+            paths.extend(sorted(glob.glob(pattern, recursive=True)))
+    return sorted(set(path for path in paths if os.path.isfile(path)))
+
+
+def log_spectrogram(data):
+    # Same normalisation and parameters as extract_spectrogram.py
+    data = np.asarray(data, dtype=np.float64)
+    peak = np.max(np.abs(data)) if data.size else 0
+    if peak == 0:
+        return None
+    _, _, Sxx = spectrogram(data / peak, nperseg=SEGMENT_LENGTH, noverlap=OVERLAP)
+    return np.log(Sxx + LOG_EPSILON).astype(np.float32)
+
+
+def extract_file(path):
+    # Runs in a worker process; returns one entry per trace
+    from obspy import read
+
+    results = []
+    for trace in read(path):
+        if len(trace.data) < SEGMENT_LENGTH:
+            continue
+        spec = log_spectrogram(trace.data)
+        if spec is None:
+            continue
+        fs = trace.stats.sampling_rate
+        results.append({
+            'station': trace.id,
+            'start': trace.stats.starttime.timestamp + (SEGMENT_LENGTH / 2) / fs,
+            'dt': (SEGMENT_LENGTH - OVERLAP) / fs,
+            'spec': spec,
+        })
+    return results
+
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {'files': {}}
+
+
+def save_manifest(manifest, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract log-spectrograms from many waveform files into a store')
+    parser.add_argument('inputs', nargs='+', help='Waveform files, directories or glob patterns')
+    parser.add_argument('--store', default=DEFAULT_STORE)
+    parser.add_argument('--manifest', help='Defaults to <store>/manifest.json')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--force', action='store_true',
+                        help='Reprocess files already in the manifest (their chunks in the store are replaced)')
+    args = parser.parse_args()
+
+    manifest_path = args.manifest or os.path.join(args.store, 'manifest.json')
+    os.makedirs(args.store, exist_ok=True)
+    manifest = load_manifest(manifest_path)
+    store = SpectrogramStore(args.store)
+
+    paths = list_files(args.inputs)
+    print(f"Found {len(paths)} files")
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # A file that cannot be read is reported and left out, not the run
+        hashes = {}
+        futures = {pool.submit(file_hash, path): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                hashes[path] = future.result()
+            except OSError as e:
+                failed += 1
+                print(f"❌ {path}: {e}")
+        todo = [path for path in paths if path in hashes and (args.force or hashes[path] not in manifest['files'])]
+        print(f"Skipping {len(hashes) - len(todo)} already processed, extracting {len(todo)}")
+
+        started = time.time()
+        futures = {pool.submit(extract_file, path): path for path in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(todo)}] ❌ {path}: {e}")
+                continue
+
+            # The parent is the store's only writer. append() replaces the
+            # chunks a trace already has in the store, so reprocessing with
+            # --force (or a copy of an archive under another path) does not
+            # add them to the index a second time.
+            for result in results:
+                store.append(result['station'], result['start'], result['spec'], result['dt'])
+            manifest['files'][hashes[path]] = {
+                'path': path,
+                'traces': [result['station'] for result in results],
+                'columns': int(sum(result['spec'].shape[1] for result in results)),
+                'processed_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            }
+            save_manifest(manifest, manifest_path)
+            print(f"[{done}/{len(todo)}] ✅ {path}: {len(results)} traces")
+
+    print(f"Done in {time.time() - started:.1f}s, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
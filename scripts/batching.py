@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+_CLOSE = object()  # queued by close(): the worker stops once it reaches it
+
+
+class _Pending:
+    # One caller waiting on a batched forward pass
+    def __init__(self, sample):
+        self.sample = sample
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchQueue:
+    # Gathers concurrent single-window requests into one model call.
+    # A batch is flushed when it reaches max_batch_size or when the oldest
+    # request has waited max_wait_ms, whichever comes first.
+    # on_batch(batch_size, seconds) is called after every forward pass.
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5, name='batch-queue', on_batch=None):
+        self.predict_fn = predict_fn
+        self.on_batch = on_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, sample, timeout=None):
+        # Blocks the calling request thread until its probability is ready
+        pending = _Pending(sample)
+        with self._lock:
+            if self._closed:
+                # The worker has stopped (e.g. a retired model version still
+                # held by a slow request): run this sample on its own
+                return float(np.asarray(self.predict_fn(sample[np.newaxis])).reshape(-1)[0])
+            self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError('Timed out waiting for batched prediction')
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def close(self):
+        # Requests queued before close() are still answered; later ones run
+        # unbatched on the caller's thread
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_CLOSE)
+
+    def _collect(self):
+        # (batch, closing)
+        first = self._queue.get()
+        if first is _CLOSE:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    pending = self._queue.get(timeout=remaining)
+                else:
+                    pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is _CLOSE:
+                return batch, True
+            batch.append(pending)
+        return batch, False
+
+    def _run(self):
+        closing = False
+        while not closing:
+            batch, closing = self._collect()
+
+            # Windows of different lengths (e.g. single-row requests) cannot
+            # be stacked together, so run one forward pass per shape
+            groups = {}
+            for pending in batch:
+                groups.setdefault(pending.sample.shape, []).append(pending)
+
+            for group in groups.values():
+                try:
+                    samples = np.stack([p.sample for p in group])
+                    start = time.perf_counter()
+                    probabilities = np.asarray(self.predict_fn(samples)).reshape(len(group), -1)[:, 0]
+                    if self.on_batch is not None:
+                        self.on_batch(len(group), time.perf_counter() - start)
+                    for pending, probability in zip(group, probabilities):
+                        pending.result = float(probability)
+                except Exception as e:
+                    for pending in group:
+                        pending.error = e
+                finally:
+                    for pending in group:
+                        pending.done.set()
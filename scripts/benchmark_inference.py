@@ -0,0 +1,68 @@
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from inference_engine import InferenceEngine, SEISMIC_INPUT_SHAPE, CYCLONE_INPUT_SHAPE
+
+MODELS = {
+    "earthquake": ('models/seismic_best_gru.h5', SEISMIC_INPUT_SHAPE),
+    "cyclone": ('models/cyclone_best_gru.h5', CYCLONE_INPUT_SHAPE),
+}
+
+
+def time_calls(fn, sample, iterations):
+    # Per-call latencies in milliseconds
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(sample)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def summarize(latencies):
+    return {
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def benchmark_model(model_path, input_shape, batch_sizes, iterations):
+    model = tf.keras.models.load_model(model_path, compile=False)
+    engine = InferenceEngine(model, input_shape, warmup_batch_sizes=batch_sizes)
+
+    results = []
+    for batch_size in batch_sizes:
+        sample = np.random.rand(batch_size, *input_shape).astype(np.float32)
+        model.predict(sample, verbose=0)  # warm up the predict path too
+        keras_stats = summarize(time_calls(lambda x: model.predict(x, verbose=0), sample, iterations))
+        engine_stats = summarize(time_calls(engine.predict, sample, iterations))
+        results.append({
+            "batch_size": batch_size,
+            "model.predict": keras_stats,
+            "engine": engine_stats,
+            "speedup": keras_stats["mean_ms"] / engine_stats["mean_ms"],
+        })
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare model.predict with the compiled inference engine')
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 32])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    print("{:<12} {:<6} {:<22} {:<22} {:<8}".format("Model", "Batch", "model.predict ms", "engine ms", "Speedup"))
+    for name in args.models:
+        model_path, input_shape = MODELS[name]
+        for r in benchmark_model(model_path, input_shape, args.batch_sizes, args.iterations):
+            keras_stats, engine_stats = r["model.predict"], r["engine"]
+            print("{:<12} {:<6} {:<22} {:<22} {:<8.1f}".format(
+                name, r["batch_size"],
+                "{:.2f} (p99 {:.2f})".format(keras_stats["mean_ms"], keras_stats["p99_ms"]),
+                "{:.2f} (p99 {:.2f})".format(engine_stats["mean_ms"], engine_stats["p99_ms"]),
+                r["speedup"]))
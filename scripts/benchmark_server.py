@@ -0,0 +1,283 @@
+import argparse
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from payload import encode_raw, encode_npy, window_from_json, check_window, decode_raw, decode_npy, SHAPE_HEADER
+
+# Load test for the prediction API plus in-process microbenchmarks.
+#
+# Starts scripts/deploy_both.py (or serve.py with --serve) unless --url is
+# given, then runs every combination of hazard, payload format, batch size
+# and concurrency for --requests requests each, and reports throughput and
+# latency percentiles. Batch sizes above 1 go to /predict/batch/<hazard>.
+# Results are written to JSON with the git commit so runs can be compared.
+#
+# Usage (from the repo root):
+#   python scripts/benchmark_server.py --concurrency 1 8 32 --formats json raw --micro
+
+HAZARDS = {
+    'earthquake': (64, 129),
+    'cyclone': (64, 6),
+}
+FORMATS = ('json', 'raw', 'npy')
+PAYLOAD_POOL = 64
+
+
+def percentiles(latencies_ms):
+    latencies_ms = np.asarray(latencies_ms)
+    if not len(latencies_ms):
+        return {}
+    return {
+        'mean_ms': float(latencies_ms.mean()),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'max_ms': float(latencies_ms.max()),
+    }
+
+
+# --- Server under test ------------------------------------------------------
+
+def start_server(serve, port, with_cache, fast_start=False):
+    # Without the Flask debugger and reloader, which would otherwise be part
+    # of every timing (and import the app twice at start-up)
+    env = dict(os.environ, PORT=str(port), FAST_START='1' if fast_start else '0', FLASK_DEBUG='0')
+    if not with_cache:
+        # Repeated payloads would otherwise be answered from the result cache
+        env['PREDICTION_CACHE_SIZE'] = '0'
+    if serve:
+        command = [sys.executable, 'scripts/serve.py', '--port', str(port)]
+        if not with_cache:
+            command += ['--prediction-cache-size', '0']
+        if fast_start:
+            command += ['--fast-start']
+    else:
+        command = [sys.executable, 'scripts/deploy_both.py']
+    # Own process group, so stop_server also stops serve.py's workers
+    return subprocess.Popen(command, env=env, start_new_session=True)
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def wait_for_server(url, process=None, timeout=300):
+    # Seconds since the call until /health answered and until /ready
+    # returned 200 (the cold start, when the server was just launched)
+    started = time.monotonic()
+    deadline = started + timeout
+    health_s = None
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if health_s is None:
+                requests.get(url + '/health', timeout=1).raise_for_status()
+                health_s = time.monotonic() - started
+            if requests.get(url + '/ready', timeout=1).status_code == 200:
+                return {'health_s': health_s, 'ready_s': time.monotonic() - started}
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"Server at {url} was not ready within {timeout}s")
+
+
+# --- Load generation --------------------------------------------------------
+
+def make_payloads(window_shape, fmt, batch_size, count=PAYLOAD_POOL, seed=0):
+    # (kwargs for requests.post) built up front, so encoding is not timed
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for _ in range(count):
+        array = rng.random((batch_size,) + window_shape, dtype=np.float32)
+        if batch_size == 1:
+            array = array[0]
+        if fmt == 'json':
+            key = 'windows' if batch_size > 1 else 'spectrogram'
+            payloads.append({'data': json.dumps({key: array.tolist()}),
+                             'headers': {'Content-Type': 'application/json'}})
+        else:
+            body, headers = encode_raw(array) if fmt == 'raw' else encode_npy(array)
+            payloads.append({'data': body, 'headers': headers})
+    return payloads
+
+
+def run_scenario(url, hazard, fmt, batch_size, concurrency, n_requests):
+    window_shape = HAZARDS[hazard]
+    endpoint = f"{url}/predict/batch/{hazard}" if batch_size > 1 else f"{url}/predict/{hazard}"
+    payloads = make_payloads(window_shape, fmt, batch_size)
+
+    counter = iter(range(n_requests))
+    counter_lock = threading.Lock()
+    latencies, errors = [], []
+    local = threading.local()
+
+    def client():
+        session = getattr(local, 'session', None) or requests.Session()
+        local.session = session
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                response = session.post(endpoint, timeout=60, **payloads[i % len(payloads)])
+                elapsed = (time.perf_counter() - start) * 1000
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(response.status_code)
+            except requests.RequestException as e:
+                errors.append(type(e).__name__)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    wall = time.perf_counter() - started
+
+    return {
+        'hazard': hazard,
+        'format': fmt,
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'requests': n_requests,
+        'errors': len(errors),
+        'error_codes': sorted({str(e) for e in errors}),
+        'requests_per_s': len(latencies) / wall,
+        'windows_per_s': len(latencies) * batch_size / wall,
+        **percentiles(latencies),
+    }
+
+
+# --- Microbenchmarks --------------------------------------------------------
+
+def microbenchmarks(hazards, batch_sizes, iterations):
+    # Per-stage costs of a request, measured in this process
+    from benchmark_inference import MODELS, time_calls, benchmark_model
+
+    results = []
+    for hazard in hazards:
+        rows, cols = HAZARDS[hazard]
+        window = np.random.rand(rows, cols).astype(np.float32)
+        json_body = json.dumps({'spectrogram': window.tolist()})
+        raw_body, raw_headers = encode_raw(window)
+        npy_body, _ = encode_npy(window)
+
+        stages = {
+            'json_parse': (lambda body: json.loads(body), json_body),
+            'json_to_array': (lambda data: window_from_json(data['spectrogram']), json.loads(json_body)),
+            'decode_raw': (lambda body: decode_raw(body, raw_headers[SHAPE_HEADER]), raw_body),
+            'decode_npy': (decode_npy, npy_body),
+            'validate': (lambda x: check_window(x, rows, cols), window),
+        }
+        for stage, (fn, sample) in stages.items():
+            results.append({'hazard': hazard, 'stage': stage,
+                            **percentiles(time_calls(fn, sample, iterations))})
+
+        model_path, input_shape = MODELS[hazard]
+        for r in benchmark_model(model_path, input_shape, batch_sizes, iterations):
+            results.append({'hazard': hazard, 'stage': 'model.predict', 'batch_size': r['batch_size'],
+                            **r['model.predict']})
+            results.append({'hazard': hazard, 'stage': 'engine.predict', 'batch_size': r['batch_size'],
+                            **r['engine']})
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hazard prediction API')
+    parser.add_argument('--url', help='Benchmark a running server instead of starting one')
+    parser.add_argument('--serve', action='store_true', help='Start serve.py instead of deploy_both.py')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--with-cache', action='store_true', help='Leave the prediction cache enabled')
+    parser.add_argument('--fast-start', action='store_true', help='Start the server with FAST_START=1')
+    parser.add_argument('--hazards', nargs='+', choices=sorted(HAZARDS), default=sorted(HAZARDS))
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=['json', 'raw'])
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1],
+                        help='Windows per request; above 1 uses /predict/batch/<hazard>')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=500, help='Requests per scenario')
+    parser.add_argument('--micro', action='store_true', help='Also run in-process microbenchmarks')
+    parser.add_argument('--micro-iterations', type=int, default=200)
+    parser.add_argument('--out', default=f"benchmarks/server-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    args = parser.parse_args()
+
+    url = (args.url or f"http://127.0.0.1:{args.port}").rstrip('/')
+    process = None if args.url else start_server(args.serve, args.port, args.with_cache, args.fast_start)
+    # What was measured: a launched server always runs without the Flask
+    # debugger and reloader, so its cold start is one import of the app
+    server = {'url': url, 'launched': process is not None}
+    if process is not None:
+        server.update({'script': 'serve.py' if args.serve else 'deploy_both.py', 'debug': False,
+                       'reloader': False, 'fast_start': args.fast_start, 'prediction_cache': args.with_cache})
+    try:
+        cold_start = wait_for_server(url, process)
+        if process is None:
+            cold_start = None  # the server was already running
+        else:
+            print("Cold start of {script} (fast_start={fast_start}): ".format(**server) +
+                  "/health after {health_s:.2f}s, /ready after {ready_s:.2f}s".format(**cold_start))
+
+        scenarios = []
+        print("{:<11} {:<5} {:<6} {:<5} {:>9} {:>9} {:>9} {:>9} {:>7}".format(
+            "Hazard", "Fmt", "Batch", "Conc", "req/s", "p50 ms", "p95 ms", "p99 ms", "errors"))
+        for hazard in args.hazards:
+            for fmt in args.formats:
+                for batch_size in args.batch_sizes:
+                    # Warm connections and the server's code paths
+                    run_scenario(url, hazard, fmt, batch_size, 1, 5)
+                    for concurrency in args.concurrency:
+                        r = run_scenario(url, hazard, fmt, batch_size, concurrency, args.requests)
+                        scenarios.append(r)
+                        print("{:<11} {:<5} {:<6} {:<5} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>7}".format(
+                            hazard, fmt, batch_size, concurrency, r['requests_per_s'],
+                            r.get('p50_ms', float('nan')), r.get('p95_ms', float('nan')),
+                            r.get('p99_ms', float('nan')), r['errors']))
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    micro = microbenchmarks(args.hazards, [1, 32], args.micro_iterations) if args.micro else []
+    for r in micro:
+        print("{:<11} {:<16} {:<6} mean {:.3f} ms  p99 {:.3f} ms".format(
+            r['hazard'], r['stage'], r.get('batch_size', ''), r['mean_ms'], r['p99_ms']))
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump({
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'host': {'platform': platform.platform(), 'cpus': os.cpu_count()},
+            'server': server,
+            'cold_start': cold_start,
+            'settings': vars(args),
+            'scenarios': scenarios,
+            'microbenchmarks': micro,
+        }, f, indent=1)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
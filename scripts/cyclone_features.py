@@ -0,0 +1,165 @@
+import argparse
+import os
+
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+
+from ibtracs_reader import load_tracks
+from land_distance import LandDistanceRaster, RASTER_FILE
+from windowing import WINDOW_SIZE, feature_windows, split_indices
+
+# Feature engineering for the cyclone GRU, over the track files written by
+# ibtracs_reader.py / preprocess_cyclone.py. Everything is vectorised over
+# the whole archive; windows never cross storm boundaries.
+#
+# Features, in the order /predict/cyclone expects them:
+#   lat, lon, pressure (hPa), wind speed (knots), storm age (hours),
+#   distance to land (km, from the land_distance.py raster)
+#
+# Outputs:
+#   cyclone_features.npy   (n_obs, 6) float32, rows aligned with cyclone_tracks.npy
+#   cyclone_windows.npy    WINDOW_DTYPE, one row per 64-step window
+
+FEATURES = ('lat', 'lon', 'pressure', 'wind', 'storm_age', 'distance_to_land')
+
+FEATURES_FILE = 'data/cyclone/cyclone_features.npy'
+WINDOWS_FILE = 'data/cyclone/cyclone_windows.npy'
+
+WINDOW_DTYPE = np.dtype([
+    ('start', '<i8'),   # first row in cyclone_features.npy
+    ('storm', '<i4'),
+    ('label', '<f4'),
+])
+
+# Label: the storm reaches hurricane strength within the next HORIZON
+# observations (24 h at IBTrACS' 3-hourly spacing) after the window
+HURRICANE_WIND = 64.0
+HORIZON = 8
+OBS_HOURS = 3.0
+
+
+# --- Distance-to-land fallback raster ---------------------------------------
+
+def raster_from_dist2land(tracks, resolution=1.0):
+    # Fallback when no coastline raster has been built: mean reported IBTrACS
+    # dist2land around each grid node, with nodes that have no nearby
+    # observation taking the value of the nearest node that has one
+    known = np.isfinite(tracks['dist2land'])
+    n_lat, n_lon = int(round(180 / resolution)) + 1, int(round(360 / resolution))
+    lat = np.asarray(tracks['lat'][known], dtype=np.float64)
+    lon = np.asarray(tracks['lon'][known], dtype=np.float64)
+    rows = np.clip(np.round((lat + 90.0) / resolution).astype(np.int64), 0, n_lat - 1)
+    cols = np.round(((lon + 180.0) % 360.0) / resolution).astype(np.int64) % n_lon
+    nodes = rows * n_lon + cols
+    sums = np.bincount(nodes, weights=tracks['dist2land'][known], minlength=n_lat * n_lon)
+    counts = np.bincount(nodes, minlength=n_lat * n_lon)
+
+    grid = np.full(n_lat * n_lon, np.nan, dtype=np.float32)
+    grid[counts > 0] = sums[counts > 0] / counts[counts > 0]
+    grid = grid.reshape(n_lat, n_lon)
+    missing = np.isnan(grid)
+    if missing.all():
+        raise ValueError("No dist2land values in the track file and no land-distance raster")
+    _, (nearest_rows, nearest_cols) = distance_transform_edt(missing, return_indices=True)
+    return LandDistanceRaster(grid[nearest_rows, nearest_cols])
+
+
+# --- Features ---------------------------------------------------------------
+
+def pressure_from_wind(wind):
+    # Atkinson-Holliday wind-pressure relation, V = 6.7 (1010 - P) ** 0.644
+    return 1010.0 - (np.asarray(wind, dtype=np.float64) / 6.7) ** (1 / 0.644)
+
+
+def compute_features(tracks, storms, raster):
+    n = len(tracks)
+    storm_start = np.repeat(storms['offset'], storms['count'])
+    position = np.arange(n) - storm_start
+
+    # Pressure: forward-fill gaps within each storm, then estimate the rest
+    # (e.g. a storm's first fixes) from the wind speed
+    pressure = np.asarray(tracks['pres'], dtype=np.float64)
+    last_known = np.where(np.isfinite(pressure), np.arange(n), -1)
+    last_known = np.maximum.accumulate(last_known)
+    from_same_storm = last_known >= storm_start
+    pressure = np.where(from_same_storm, pressure[np.maximum(last_known, 0)], np.nan)
+    pressure = np.where(np.isfinite(pressure), pressure, pressure_from_wind(tracks['wind']))
+
+    # Storm age in hours since the storm's first valid fix
+    time = np.asarray(tracks['time'], dtype=np.float64)
+    age = (time - time[storm_start]) / 3600.0
+    age = np.where(np.isfinite(age), age, position * OBS_HOURS)
+
+    features = np.empty((n, len(FEATURES)), dtype=np.float32)
+    features[:, 0] = tracks['lat']
+    features[:, 1] = tracks['lon']
+    features[:, 2] = pressure
+    features[:, 3] = tracks['wind']
+    features[:, 4] = age
+    features[:, 5] = raster.lookup(tracks['lat'], tracks['lon'])
+    return features
+
+
+def build_windows(tracks, storms, window_size=WINDOW_SIZE, horizon=HORIZON):
+    # Per-storm sliding windows, as start offsets into the feature rows
+    n_windows = np.maximum(storms['count'] - window_size, 0)
+    storm_ids = np.repeat(np.arange(len(storms)), n_windows)
+    first_window = np.cumsum(n_windows) - n_windows
+    starts = np.repeat(storms['offset'], n_windows) + (np.arange(n_windows.sum()) - np.repeat(first_window, n_windows))
+
+    # Future max wind over the next `horizon` fixes of the same storm
+    ends = starts + window_size - 1
+    ahead = ends[:, np.newaxis] + np.arange(1, horizon + 1)
+    storm_end = (storms['offset'] + storms['count'])[storm_ids]
+    in_storm = ahead < storm_end[:, np.newaxis]
+    wind = np.asarray(tracks['wind'])
+    future_wind = np.where(in_storm, wind[np.minimum(ahead, len(wind) - 1)], -np.inf).max(axis=1)
+
+    windows = np.empty(len(starts), dtype=WINDOW_DTYPE)
+    windows['start'] = starts
+    windows['storm'] = storm_ids
+    windows['label'] = future_wind >= HURRICANE_WIND
+    return windows
+
+
+# --- Loading ----------------------------------------------------------------
+
+def load_windows(features_file=FEATURES_FILE, windows_file=WINDOWS_FILE, window_size=WINDOW_SIZE):
+    # (all windows as a strided view over the features, window index)
+    features = np.load(features_file, mmap_mode='r')
+    return feature_windows(features, window_size), np.load(windows_file)
+
+
+def storm_split(windows, test_size=0.2, random_state=42):
+    # Split by storm so overlapping windows of one storm never end up on
+    # both sides of the split
+    train_storms, _ = split_indices(int(windows['storm'].max()) + 1, test_size, random_state)
+    in_train = np.isin(windows['storm'], train_storms)
+    return np.nonzero(in_train)[0], np.nonzero(~in_train)[0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build cyclone GRU features and windows from the track files')
+    parser.add_argument('--land-raster', default=RASTER_FILE,
+                        help='Raster built by land_distance.py; IBTrACS dist2land is used if it does not exist')
+    parser.add_argument('--features', default=FEATURES_FILE)
+    parser.add_argument('--windows', default=WINDOWS_FILE)
+    args = parser.parse_args()
+
+    tracks, storms = load_tracks()
+
+    if os.path.exists(args.land_raster):
+        raster = LandDistanceRaster.load(args.land_raster)
+    else:
+        print(f"No land-distance raster at {args.land_raster}, falling back to IBTrACS dist2land")
+        raster = raster_from_dist2land(tracks)
+
+    features = compute_features(tracks, storms, raster)
+    np.save(args.features, features)
+
+    windows = build_windows(tracks, storms)
+    np.save(args.windows, windows)
+
+    print(f"Features: {features.shape} -> {args.features}")
+    print(f"Windows: {len(windows)} from {len(np.unique(windows['storm']))} storms, "
+          f"{windows['label'].mean():.1%} positive -> {args.windows}")
@@ -1,89 +1,429 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import numpy as np
-import tensorflow as tf
 import traceback
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from batching import BatchQueue
+from inference_engine import load_engine, parity_passed, tflite_path
+from metrics import ServerMetrics, BATCH_SIZE_BUCKETS, log_payload_sample
+from payload import (PayloadError, parse_body, parse_hazards, to_array, check_window, check_windows, read_array,
+                     check_columns, max_body_bytes, HAZARD_FEATURES)
+from model_loader import ModelLoader
+from model_registry import ModelRegistry, ServedModel
+from prediction_cache import make_cache
+from windowing import model_layout
 
 app = Flask(__name__)
 CORS(app)   
 
-# Load Cyclone model
-try:
-    cyclone_model = tf.keras.models.load_model('models/cyclone_best_gru.h5')
-    print("✅ Loaded cyclone model")
-except Exception as e:
-    print(f"❌ Failed to load cyclone model: {e}")
-    cyclone_model = None
-
-# Load Earthquake (Seismic) model
-try:
-    earthquake_model = tf.keras.models.load_model('models/seismic_best_gru.h5')
-    print("✅ Loaded earthquake model")
-except Exception as e:
-    print(f"❌ Failed to load earthquake model: {e}")
-    earthquake_model = None
-
-def validate_input(data, expected_rows=64, expected_cols=None):
-    if not isinstance(data, list):
-        return False
-    if len(data) not in [1, expected_rows]:  # Allow single row or full expected rows
-        return False
-    for row in data:
-        if not isinstance(row, list):
-            return False
-        if len(row) != expected_cols:
-            return False
-    return True
+# Request counts/latency, in-flight requests and per-stage timings at /metrics
+metrics = ServerMetrics(app)
+batch_seconds = metrics.registry.histogram('hazard_batch_forward_seconds', 'Forward pass of one batch',
+                                           ('model', 'role'))
+batch_sizes = metrics.registry.histogram('hazard_batch_size', 'Windows per forward pass', ('model', 'role'),
+                                         buckets=BATCH_SIZE_BUCKETS)
+queue_depth = metrics.registry.gauge('hazard_batch_queue_depth', 'Requests waiting for a batch', ('model', 'role'))
 
-@app.route('/predict/cyclone', methods=['POST'])
-def predict_cyclone():
-    if cyclone_model is None:
-        return jsonify({'error': 'Cyclone model not loaded'}), 500
+# Per model version, to compare a candidate against the primary on live
+# traffic: time to answer a window and the distribution of its scores
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+version_labels = ('model', 'role', 'version')
+version_seconds = metrics.registry.histogram('hazard_model_seconds', 'Prediction time per model version',
+                                             version_labels)
+version_scores = metrics.registry.histogram('hazard_model_score', 'Predicted probability per model version',
+                                            version_labels, buckets=SCORE_BUCKETS)
+
+def record_batch(model, role):
+    def on_batch(size, seconds):
+        batch_seconds.observe(seconds, model=model, role=role)
+        batch_sizes.observe(size, model=model, role=role)
+    return on_batch
+
+def record_prediction(served, seconds, probability):
+    labels = dict(model=served.hazard, role=served.role, version=served.version)
+    version_seconds.observe(seconds, **labels)
+    version_scores.observe(probability, **labels)
+
+# Dynamic batching: concurrent requests are grouped into one forward pass
+# of up to BATCH_MAX_SIZE windows, waiting at most BATCH_MAX_WAIT_MS
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+
+# HAZARD_BACKEND=tflite serves the artifacts written by export_tflite.py
+# (TFLITE_QUANTIZATION picks which) instead of the Keras .h5 models;
+# 'auto' uses the artifact where one has been exported and passed parity
+HAZARD_BACKEND = os.environ.get('HAZARD_BACKEND', 'keras')
+TFLITE_QUANTIZATION = os.environ.get('TFLITE_QUANTIZATION', 'float16')
+
+def model_file(path):
+    artifact = tflite_path(path, TFLITE_QUANTIZATION)
+    if HAZARD_BACKEND == 'tflite' or (HAZARD_BACKEND == 'auto' and os.path.exists(artifact) and parity_passed(artifact)):
+        return artifact
+    return path
+
+# Models are served from MODEL_DIR through the registry, which reloads a
+# file when it changes and routes a share of the traffic to a candidate
+# model as set in MODEL_DIR/routing.json (see model_registry.py)
+MODEL_DIR = os.environ.get('MODEL_DIR', 'models')
+MODEL_POLL_S = float(os.environ.get('MODEL_POLL_S', 5))
+DEFAULT_MODELS = {'cyclone': 'cyclone_best_gru.h5', 'earthquake': 'seismic_best_gru.h5'}
+
+# Result cache in front of the single-window routes, keyed by window content
+# and model file hash. PREDICTION_CACHE_PATH shares it between processes.
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 65536))
+PREDICTION_CACHE_PATH = os.environ.get('PREDICTION_CACHE_PATH') or None
+
+# Bulk scoring: /predict/batch/<hazard> runs its windows through the engine
+# directly, BULK_CHUNK_SIZE windows per forward pass
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 256))
+BULK_MAX_WINDOWS = int(os.environ.get('BULK_MAX_WINDOWS', 100000))
+# Bodies are capped at the size of the largest bulk request; serve.py passes
+# its front end's limit down so both reject the same requests
+MAX_BODY_BYTES = int(os.environ.get('MAX_BODY_BYTES') or max_body_bytes(BULK_MAX_WINDOWS))
+app.config['MAX_CONTENT_LENGTH'] = MAX_BODY_BYTES
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+# Fused routes (/predict/all, /predict/batch/all) run each hazard's model on
+# its own executor, so a request takes as long as the slower model rather
+# than the sum of both
+FUSED_THREADS = int(os.environ.get('FUSED_THREADS', 8))
+hazard_executors = {hazard: ThreadPoolExecutor(max_workers=FUSED_THREADS, thread_name_prefix=f'{hazard}-fused')
+                    for hazard in HAZARD_FEATURES}
+
+# Stateful earthquake streams: per-stream GRU state, bounded by count and idle time
+STREAM_MAX_SESSIONS = int(os.environ.get('STREAM_MAX_SESSIONS', 1024))
+STREAM_TTL_S = float(os.environ.get('STREAM_TTL_S', 600))
+STREAM_MAX_PUSH_ROWS = 1024
+
+# Models load in parallel on background threads. With FAST_START=1 the
+# server binds before they finish: /health answers at once, /ready and the
+# predict routes return 503 until the models are in. Otherwise the import
+# waits for them as before.
+FAST_START = os.environ.get('FAST_START', '0') == '1'
+
+loader = ModelLoader(app)
+
+def cnn_windows(batch):
+    # (n, 64, freq) request windows -> (n, freq, 64, 1) for CNN models
+    return np.asarray(batch, dtype=np.float32).transpose(0, 2, 1)[..., np.newaxis]
+
+def open_streams(engine):
+    # Stateful streams need the Keras GRU; None when they are not available
+    if engine.model is None:
+        print("⚠️ Earthquake streaming needs the Keras backend")
+        return None
+    # Imports TensorFlow, so only on the Keras backend
+    from streaming_sessions import RecurrentStepper, SessionStore
     try:
-        data = request.json.get('spectrogram')
-        if data is None:
-            return jsonify({'error': "Missing 'spectrogram' key"}), 400
+        return SessionStore(RecurrentStepper(engine.model),
+                            max_sessions=STREAM_MAX_SESSIONS, ttl_s=STREAM_TTL_S,
+                            id_prefix=os.environ.get('WORKER_INDEX'))
+    except ValueError as e:
+        print(f"⚠️ Earthquake streaming disabled: {e}")
+        return None
+
+def build_model(hazard, role, path, version):
+    # Called by the registry on a background thread for every version it
+    # loads. The engine takes the model's own input shape, is traced and
+    # warmed for the smallest and largest batch the batcher produces, and
+    # gets its own batcher and a cache keyed by its version.
+    engine = load_engine(path, warmup_batch_sizes=(1, BATCH_MAX_SIZE))
+    layout = model_layout((None,) + engine.input_shape)
+    served = ServedModel(hazard, role, path, version, engine, adapt=cnn_windows if layout == 'cnn' else None)
+    served.cache = make_cache(path, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_PATH, version=version)
+    served.batcher = BatchQueue(served.predict,
+                                max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                                name=f'{hazard}-{role}-batcher', on_batch=record_batch(hazard, role))
+    queue_depth.set_function(served.batcher.depth, model=hazard, role=role)
+    if hazard == 'earthquake' and role == 'primary':
+        # Open streams hold state of the model they were opened on, so a
+        # reload starts a new store and clients of the old one reopen
+        served.streams = open_streams(engine)
+    return served
+
+registry = ModelRegistry(MODEL_DIR, DEFAULT_MODELS, build_model, resolve=model_file, poll_s=MODEL_POLL_S)
+metrics.registry.gauge('hazard_stream_sessions', 'Open earthquake streams').set_function(
+    lambda: len(earthquake_streams() or ()))
+
+registry.start(loader)
+if not FAST_START:
+    loader.wait()
+
+def payload_error(e):
+    return jsonify(e.to_dict()), 400
 
-        # Validate input for cyclone: 64 (or 1) rows and 6 columns
-        if not validate_input(data, expected_rows=64, expected_cols=6):
-            return jsonify({'error': "Input must be 64 rows (or 1 row) with 6 columns"}), 400
+@app.before_request
+def reject_large_body():
+    # Checked up front: read inside a route, Werkzeug's RequestEntityTooLarge
+    # would end up in the routes' generic 400 handling
+    if request.content_length is not None and request.content_length > MAX_BODY_BYTES:
+        return jsonify({'error': 'Request body too large', 'max_bytes': MAX_BODY_BYTES}), 413
 
-        sample = np.array(data)
-        sample = np.expand_dims(sample, axis=0)  # Add batch dimension
+def cached_predict(batcher, cache, sample):
+    # Repeated windows are answered from the cache without a forward pass
+    if cache is None:
+        return batcher.submit(sample)
+    key = cache.key(sample)
+    prediction = cache.get(key)
+    if prediction is None:
+        prediction = batcher.submit(sample)
+        cache.put(key, prediction)
+    return prediction
 
-        prediction = cyclone_model.predict(sample).flatten()[0]
-        return jsonify({'probability': float(prediction)})
+def served_predict(served, sample):
+    start = time.perf_counter()
+    prediction = cached_predict(served.batcher, served.cache, sample)
+    record_prediction(served, time.perf_counter() - start, prediction)
+    return prediction
 
+def pick_model(hazard, rows=64):
+    # Single-row windows only fit the recurrent primary
+    return registry.route(hazard) if rows == 64 else registry.get(hazard)
+
+def score_window(served, sample):
+    return {'probability': served_predict(served, sample), 'model_version': served.version, 'model_role': served.role}
+
+def predict_window(route, hazard):
+    # Shared body of the single-window routes, timed stage by stage
+    stages = metrics.stages(route)
+    try:
+        with stages('parse'):
+            data = parse_body(request)
+        with stages('convert'):
+            sample = to_array(data)
+        with stages('validate'):
+            # 64 (or 1) rows of the hazard's columns
+            sample = check_window(sample, expected_rows=64, expected_cols=HAZARD_FEATURES[hazard])
+        log_payload_sample(route, sample)
+
+        with stages('model'):
+            # Batch dimension is added by the batcher when it stacks requests
+            result = score_window(pick_model(hazard, sample.shape[0]), sample)
+        with stages('serialize'):
+            return jsonify(result)
+
+    except PayloadError as e:
+        return payload_error(e)
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 400
 
+@app.route('/predict/cyclone', methods=['POST'])
+def predict_cyclone():
+    if registry.get('cyclone') is None:
+        return loader.unavailable('cyclone')
+    return predict_window('/predict/cyclone', 'cyclone')
+
 @app.route('/predict/earthquake', methods=['POST'])
 def predict_earthquake():
-    if earthquake_model is None:
-        return jsonify({'error': 'Earthquake model not loaded'}), 500
+    if registry.get('earthquake') is None:
+        return loader.unavailable('earthquake')
+    # Model expects 3D input: (batch, timesteps, features); the batcher
+    # stacks concurrent (timesteps, features) windows into one batch
+    return predict_window('/predict/earthquake', 'earthquake')
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    # Primary model caches; /models lists every loaded version's
+    served = {hazard: registry.get(hazard) for hazard in HAZARD_FEATURES}
+    return jsonify({hazard: model.cache.stats() if model is not None and model.cache is not None else None
+                    for hazard, model in served.items()})
+
+@app.route('/models', methods=['GET'])
+def models_status():
+    return jsonify(registry.status())
+
+def score_chunks(served, windows):
+    # Yields (offset, probabilities) per forward pass of BULK_CHUNK_SIZE windows
+    for start in range(0, len(windows), BULK_CHUNK_SIZE):
+        chunk = windows[start:start + BULK_CHUNK_SIZE]
+        began = time.perf_counter()
+        probabilities = served.predict(chunk).reshape(len(chunk), -1)[:, 0]
+        version_seconds.observe(time.perf_counter() - began, model=served.hazard, role=served.role,
+                                version=served.version)
+        yield start, probabilities
+
+def score_windows(served, windows):
+    return {'probabilities': [float(p) for _, chunk in score_chunks(served, windows) for p in chunk],
+            'model_version': served.version, 'model_role': served.role}
+
+def wants_ndjson():
+    return request.args.get('stream') in ('1', 'true') or NDJSON_CONTENT_TYPE in request.headers.get('Accept', '')
+
+def ndjson_lines(served, windows):
+    # One {"index", "probability"} line per window, written as each chunk is
+    # scored, so the full result is never held by the server
     try:
-        data = request.json.get('spectrogram')
-        if data is None:
-            return jsonify({'error': "Missing 'spectrogram' key"}), 400
+        for start, probabilities in score_chunks(served, windows):
+            yield ''.join(json.dumps({'index': start + i, 'probability': float(p)}) + '\n'
+                          for i, p in enumerate(probabilities))
+    except Exception as e:
+        # Headers are already sent: report the failure as the last line
+        traceback.print_exc()
+        yield json.dumps({'error': str(e)}) + '\n'
 
-        # Validate input for earthquake: 64 (or 1) rows and 129 columns
-        if not validate_input(data, expected_rows=64, expected_cols=129):
-            return jsonify({'error': "Input must be 64 rows (or 1 row) with 129 columns"}), 400
+@app.route('/predict/batch/<hazard>', methods=['POST'])
+def predict_batch(hazard):
+    # Body: {"windows": [window, ...]} or a binary (N, 64, features) array
+    if hazard not in HAZARD_FEATURES:
+        return jsonify({'error': f"Unknown hazard '{hazard}'"}), 404
+    if registry.get(hazard) is None:
+        return loader.unavailable(hazard)
+    stages = metrics.stages(f'/predict/batch/{hazard}')
+    try:
+        with stages('parse'):
+            data = parse_body(request, key='windows')
+        with stages('convert'):
+            windows = to_array(data)
+        with stages('validate'):
+            windows = check_windows(windows, expected_rows=64, expected_cols=HAZARD_FEATURES[hazard],
+                                    max_windows=BULK_MAX_WINDOWS)
+        # A whole request goes to one version, so its scores are comparable
+        served = pick_model(hazard, windows.shape[1])
 
-        sample = np.array(data)
-        # Model expects 3D input: (batch, timesteps, features)
-        if sample.ndim == 2:
-            sample = np.expand_dims(sample, axis=0)
-        elif sample.ndim == 1:
-            sample = np.expand_dims(np.expand_dims(sample, axis=0), axis=-1)
+        if wants_ndjson():
+            response = Response(ndjson_lines(served, windows), mimetype=NDJSON_CONTENT_TYPE)
+            response.headers['X-Model-Version'] = served.version
+            return response
 
-        prediction = earthquake_model.predict(sample).flatten()[0]
-        return jsonify({'probability': float(prediction)})
+        with stages('model'):
+            result = score_windows(served, windows)
+        with stages('serialize'):
+            return jsonify(result)
 
+    except PayloadError as e:
+        return payload_error(e)
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 400
 
+def timed(fn, *args):
+    start = time.perf_counter()
+    return fn(*args), time.perf_counter() - start
+
+def run_fused(jobs):
+    # jobs: {hazard: (fn, served, inputs)}, each run on its hazard's
+    # executor. Returns ({hazard: result with latency_ms}, number failed);
+    # one model failing still returns the other's result.
+    futures = {hazard: hazard_executors[hazard].submit(timed, fn, served, inputs)
+               for hazard, (fn, served, inputs) in jobs.items()}
+    results, failed = {}, 0
+    for hazard, future in futures.items():
+        try:
+            result, seconds = future.result()
+            results[hazard] = {**result, 'latency_ms': seconds * 1000}
+        except Exception as e:
+            traceback.print_exc()
+            results[hazard] = {'error': str(e)}
+            failed += 1
+    return results, failed
+
+def predict_fused(route, check, score):
+    # Shared body of the fused routes: check(hazard, array) validates one
+    # hazard's input, score(served, array) runs its model
+    stages = metrics.stages(route)
+    try:
+        with stages('parse'):
+            data = parse_hazards(request, tuple(HAZARD_FEATURES))
+        for hazard in data:
+            if registry.get(hazard) is None:
+                return loader.unavailable(hazard)
+
+        inputs = {}
+        for hazard, value in data.items():
+            try:
+                with stages('convert'):
+                    array = to_array(value)
+                with stages('validate'):
+                    inputs[hazard] = check(hazard, array)
+            except PayloadError as e:
+                e.details['hazard'] = hazard
+                raise
+            log_payload_sample(route, inputs[hazard])
+
+        start = time.perf_counter()
+        with stages('model'):
+            results, failed = run_fused({hazard: (score, pick_model(hazard, array.shape[-2]), array)
+                                         for hazard, array in inputs.items()})
+        # Model failures are the server's: 200 with the failed hazards'
+        # error entries, 500 only when no model answered
+        with stages('serialize'):
+            return (jsonify({**results, 'latency_ms': (time.perf_counter() - start) * 1000}),
+                    500 if failed == len(results) else 200)
+
+    except PayloadError as e:
+        return payload_error(e)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/predict/all', methods=['POST'])
+def predict_all():
+    # Body: {"cyclone": window, "earthquake": window}, either may be left out
+    return predict_fused('/predict/all',
+                         lambda hazard, sample: check_window(sample, expected_rows=64,
+                                                             expected_cols=HAZARD_FEATURES[hazard]),
+                         score_window)
+
+@app.route('/predict/batch/all', methods=['POST'])
+def predict_batch_all():
+    # Body: {"cyclone": [window, ...], "earthquake": [window, ...]}
+    return predict_fused('/predict/batch/all',
+                         lambda hazard, windows: check_windows(windows, expected_rows=64,
+                                                               expected_cols=HAZARD_FEATURES[hazard],
+                                                               max_windows=BULK_MAX_WINDOWS),
+                         score_windows)
+
+def earthquake_streams():
+    served = registry.get('earthquake')
+    return served.streams if served is not None else None
+
+def streaming_unavailable():
+    if loader.status.get('earthquake') == 'loading':
+        return loader.unavailable('earthquake', 'Earthquake streaming')
+    return jsonify({'error': 'Earthquake streaming not available'}), 500
+
+@app.route('/stream/earthquake', methods=['POST'])
+def open_earthquake_stream():
+    streams = earthquake_streams()
+    if streams is None:
+        return streaming_unavailable()
+    return jsonify({'stream_id': streams.open(), 'ttl_s': STREAM_TTL_S}), 201
+
+@app.route('/stream/earthquake/<stream_id>', methods=['POST'])
+def push_earthquake_stream(stream_id):
+    # Body: only the new spectrogram rows, (k, 129), as JSON or binary
+    streams = earthquake_streams()
+    if streams is None:
+        return streaming_unavailable()
+    try:
+        columns = check_columns(read_array(request), expected_cols=129, max_rows=STREAM_MAX_PUSH_ROWS)
+        probability, steps = streams.push(stream_id, columns)
+        return jsonify({'probability': probability, 'steps': steps})
+
+    except KeyError:
+        return jsonify({'error': 'Unknown or expired stream'}), 404
+    except PayloadError as e:
+        return payload_error(e)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/stream/earthquake/<stream_id>', methods=['DELETE'])
+def close_earthquake_stream(stream_id):
+    streams = earthquake_streams()
+    if streams is None or not streams.close(stream_id):
+        return jsonify({'error': 'Unknown or expired stream'}), 404
+    return jsonify({'closed': stream_id})
+
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # FLASK_DEBUG=0 turns off the debugger and the reloader, whose child
+    # process imports the app and loads the models a second time (the
+    # benchmark runs this way)
+    debug = os.environ.get('FLASK_DEBUG', '1') == '1'
+    app.run(host="0.0.0.0", port=int(os.environ.get('PORT', 5000)), debug=debug, use_reloader=debug)
@@ -1,20 +1,48 @@
 from flask import Flask, request, jsonify
 import numpy as np
-import tensorflow as tf
 from flask_cors import CORS
+import os
+
+from inference_engine import load_engine, CYCLONE_INPUT_SHAPE
+from metrics import ServerMetrics, log_payload_sample
+from model_loader import ModelLoader
+from payload import is_binary_request, decode_binary
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS *after* creating the app instance
+metrics = ServerMetrics(app)
+
+# Loaded on a background thread; FAST_START=1 binds before it finishes
+loader = ModelLoader(app)
+engine = None
+
+def load():
+    global engine
+    engine = load_engine('models/cyclone_best_gru.h5', CYCLONE_INPUT_SHAPE)
 
-model = tf.keras.models.load_model('models/cyclone_best_gru.h5')
+loader.start('cyclone', load)
+if os.environ.get('FAST_START', '0') != '1':
+    loader.wait()
 
 @app.route('/predict', methods=['POST'])
 def predict():
+    if engine is None:
+        return loader.unavailable('cyclone')
+    stages = metrics.stages('/predict')
     try:
-        data = request.json['spectrogram']  # expects [window_size, num_features]
-        sample = np.array(data)
-        prediction = model.predict(np.array([sample])).flatten()[0]
-        return jsonify({'probability': float(prediction)})
+        if is_binary_request(request):
+            with stages('parse'):
+                sample = decode_binary(request)  # raw float32 or .npy body
+        else:
+            with stages('parse'):
+                data = request.json['spectrogram']  # expects [window_size, num_features]
+            with stages('convert'):
+                sample = np.array(data, dtype=np.float32)
+        log_payload_sample('/predict', sample)
+        with stages('model'):
+            prediction = engine.predict(sample[np.newaxis]).flatten()[0]
+        with stages('serialize'):
+            return jsonify({'probability': float(prediction)})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -1,37 +1,53 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import numpy as np
-import tensorflow as tf
 import traceback
+import os
+
+from inference_engine import load_engine, SEISMIC_INPUT_SHAPE
+from metrics import ServerMetrics, log_payload_sample
+from model_loader import ModelLoader
+from payload import is_binary_request, decode_binary
 
 app = Flask(__name__)
 CORS(app)
+metrics = ServerMetrics(app)
 
 model_path = 'models/seismic_best_gru.h5'
 
-try:
-    model = tf.keras.models.load_model(model_path)
-    print(f"✅ Loaded model: {model_path}")
-except Exception as e:
-    print(f"❌ Failed to load model from {model_path}: {e}")
-    model = None
+# Loaded on a background thread; FAST_START=1 binds before it finishes
+loader = ModelLoader(app)
+engine = None
+
+def load():
+    global engine
+    engine = load_engine(model_path, SEISMIC_INPUT_SHAPE)
+
+loader.start('earthquake', load)
+if os.environ.get('FAST_START', '0') != '1':
+    loader.wait()
 
 
 @app.route('/predict', methods=['POST'])
 def predict():
+    stages = metrics.stages('/predict')
     try:
-        print("\n=== 🛰️ Incoming Request ===")
-        print("Raw JSON received:", request.json)
+        if engine is None:
+            return loader.unavailable('earthquake')
 
-        if model is None:
-            return jsonify({'error': 'Model not loaded on server.'}), 500
-
-        data = request.json.get('spectrogram')
-        if data is None:
-            return jsonify({'error': "Missing 'spectrogram' key in request"}), 400
-
-        sample = np.array(data)
-        print("Original sample shape:", sample.shape)
+        if is_binary_request(request):
+            # Raw float32 or .npy body, decoded without a JSON round trip
+            with stages('parse'):
+                sample = decode_binary(request)
+        else:
+            with stages('parse'):
+                data = request.json.get('spectrogram')
+            if data is None:
+                return jsonify({'error': "Missing 'spectrogram' key in request"}), 400
+            with stages('convert'):
+                sample = np.array(data, dtype=np.float32)
+        # Set DEBUG_PAYLOAD_SAMPLE_RATE to log a summary of some payloads
+        log_payload_sample('/predict', sample)
 
         # GRU expects 3D input: (batch_size, timesteps, features)
         if sample.ndim == 2:
@@ -39,15 +55,13 @@ def predict():
         elif sample.ndim == 1:
             sample = np.expand_dims(np.expand_dims(sample, axis=0), axis=-1)
 
-        print("Prepared input shape:", sample.shape)
-
-        prediction = model.predict(sample).flatten()[0]
-        print("Model output probability:", prediction)
+        with stages('model'):
+            prediction = engine.predict(sample).flatten()[0]
 
-        return jsonify({'probability': float(prediction)})
+        with stages('serialize'):
+            return jsonify({'probability': float(prediction)})
 
     except Exception as e:
-        print("❌ Full error trace:")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 400
 
@@ -0,0 +1,169 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+
+from prediction_cache import model_version
+from windowing import WINDOW_SIZE, spectrogram_windows, half_labels, window_labels, split_indices, model_layout
+
+# Evaluation harness shared by compare_models.py and evaluate_seismic_cnn.py.
+#
+# The test split is built once as indices over a memory-mapped spectrogram;
+# every model reads strided views of it in its own layout (CNN or LSTM/GRU),
+# and only one batch of windows is gathered at a time. Models are scored
+# concurrently, and each model's predictions are cached on disk under the
+# hash of its file and of the split, so re-running a comparison only
+# scores models that changed.
+#
+# Usage (from the repo root):
+#   python scripts/evaluate_models.py --models CNN=models/seismic_best_cnn.h5 NEW=models/candidate.h5
+
+DEFAULT_MODELS = {
+    'CNN': 'models/seismic_best_cnn.h5',
+    'LSTM': 'models/seismic_best_lstm.h5',
+    'GRU': 'models/seismic_best_gru.h5',
+}
+DEFAULT_SPECTROGRAM = 'data/seismic/spectrogram.npy'
+PREDICTIONS_DIR = 'data/seismic/predictions'
+
+
+class TestSplit:
+    # The compare_models.py test split of one spectrogram
+    def __init__(self, spectrogram=DEFAULT_SPECTROGRAM, window_size=WINDOW_SIZE, test_size=0.2, random_state=42):
+        self.path = spectrogram
+        self.spec = np.load(spectrogram, mmap_mode='r')
+        self.window_size = window_size
+        y_samples = window_labels(half_labels(self.spec.shape[1]), window_size)
+        _, self.indices = split_indices(len(y_samples), test_size, random_state)
+        self.y = y_samples[self.indices]
+
+        stat = os.stat(spectrogram)
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(json.dumps([os.path.abspath(spectrogram), stat.st_size, stat.st_mtime_ns,
+                                  window_size, test_size, random_state]).encode())
+        self.key = digest.hexdigest()
+
+    def __len__(self):
+        return len(self.indices)
+
+    def windows(self, layout):
+        # Strided view over the spectrogram, nothing copied
+        return spectrogram_windows(self.spec, self.window_size, layout)
+
+    def batches(self, layout, batch_size):
+        # The shuffled test indices are rarely consecutive, so each batch is
+        # gathered straight into one C-contiguous float32 buffer (a single
+        # copy of batch_size windows, even for the transposed GRU view);
+        # memory stays bounded by one batch, never the whole split
+        view = self.windows(layout)
+        for start in range(0, len(self.indices), batch_size):
+            indices = self.indices[start:start + batch_size]
+            batch = np.empty((len(indices),) + view.shape[1:], dtype=np.float32)
+            yield np.take(view, indices, axis=0, out=batch)
+
+
+def score_model(model_path, split, batch_size=512):
+    # (probabilities, seconds spent in forward passes)
+    import tensorflow as tf
+    from inference_engine import InferenceEngine
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+    layout = model_layout(model.input_shape)
+    engine = InferenceEngine(model, split.windows(layout).shape[1:], warmup_batch_sizes=(batch_size,))
+
+    probabilities, seconds = [], 0.0
+    for batch in split.batches(layout, batch_size):
+        start = time.perf_counter()
+        probabilities.append(engine.predict(batch).reshape(-1))
+        seconds += time.perf_counter() - start
+    return np.concatenate(probabilities), seconds
+
+
+def cached_predictions(model_path, split, batch_size, cache_dir, force=False):
+    version = model_version(model_path)
+    base = os.path.join(cache_dir, f"{version}-{split.key}")
+    if not force and os.path.exists(base + '.npy') and os.path.exists(base + '.json'):
+        with open(base + '.json') as f:
+            timing = json.load(f)
+        return np.load(base + '.npy'), {**timing, 'cached': True}
+
+    probabilities, seconds = score_model(model_path, split, batch_size)
+    timing = {'model': model_path, 'model_version': version, 'inference_s': seconds,
+              'windows_per_s': len(probabilities) / seconds if seconds else None}
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(base + '.npy', probabilities.astype(np.float32))
+    with open(base + '.json', 'w') as f:
+        json.dump(timing, f, indent=1)
+    return probabilities, {**timing, 'cached': False}
+
+
+def evaluate(models, split=None, batch_size=512, jobs=None, cache_dir=PREDICTIONS_DIR, force=False):
+    # models: {name: path}. Returns one result per model, in order, with
+    # metrics, throughput and the probability vector ('y_pred_proba')
+    split = split or TestSplit()
+
+    def run(item):
+        name, path = item
+        probabilities, timing = cached_predictions(path, split, batch_size, cache_dir, force)
+        predicted = (probabilities > 0.5).astype(int)
+        return {
+            'Model': name,
+            'Accuracy': accuracy_score(split.y, predicted),
+            'Precision': precision_score(split.y, predicted, zero_division=0),
+            'Recall': recall_score(split.y, predicted, zero_division=0),
+            'F1 Score': f1_score(split.y, predicted, zero_division=0),
+            **timing,
+            'y_pred_proba': probabilities,
+        }
+
+    with ThreadPoolExecutor(max_workers=jobs or len(models)) as pool:
+        return list(pool.map(run, models.items()))
+
+
+def print_results(results):
+    print("Model Performance Comparison:")
+    print("{:<8} {:<10} {:<10} {:<10} {:<10} {:<12}".format(
+        "Model", "Accuracy", "Precision", "Recall", "F1 Score", "Windows/s"))
+    for r in results:
+        throughput = "{:.0f}".format(r['windows_per_s']) if r.get('windows_per_s') else '-'
+        if r['cached']:
+            throughput += ' (cached)'
+        print("{:<8} {:<10.3f} {:<10.3f} {:<10.3f} {:<10.3f} {:<12}".format(
+            r["Model"], r["Accuracy"], r["Precision"], r["Recall"], r["F1 Score"], throughput))
+
+
+def parse_models(values):
+    # NAME=PATH, or a bare path named after its file
+    models = {}
+    for value in values:
+        name, sep, path = value.partition('=')
+        if not sep:
+            name, path = os.path.splitext(os.path.basename(value))[0], value
+        models[name] = path
+    return models
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate seismic models on the shared test split')
+    parser.add_argument('--models', nargs='+', help='NAME=PATH or PATH (default: the CNN, LSTM and GRU)')
+    parser.add_argument('--spectrogram', default=DEFAULT_SPECTROGRAM)
+    parser.add_argument('--batch-size', type=int, default=512)
+    parser.add_argument('--jobs', type=int, help='Models scored at once (default: all)')
+    parser.add_argument('--cache-dir', default=PREDICTIONS_DIR)
+    parser.add_argument('--force', action='store_true', help='Ignore cached predictions')
+    parser.add_argument('--json', help='Also write the metrics to this file')
+    args = parser.parse_args()
+
+    models = parse_models(args.models) if args.models else DEFAULT_MODELS
+    results = evaluate(models, TestSplit(args.spectrogram), args.batch_size, args.jobs, args.cache_dir, args.force)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([{k: float(v) if isinstance(v, np.floating) else v
+                        for k, v in r.items() if k != 'y_pred_proba'} for r in results], f, indent=1)
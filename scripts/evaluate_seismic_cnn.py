@@ -1,34 +1,15 @@
 import numpy as np
-import tensorflow as tf
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix, classification_report
 import matplotlib.pyplot as plt
 
-# Load best model
-model = tf.keras.models.load_model('models/seismic_best_cnn.h5')
+from evaluate_models import TestSplit, evaluate
 
-# Load spectrogram samples and labels
-spec = np.load('data/seismic/spectrogram.npy')
-window_size = 64
-time_slices = spec.shape[1]
+# Score the best CNN on the shared test split (cached per model file)
+split = TestSplit('data/seismic/spectrogram.npy')
+result, = evaluate({'CNN': 'models/seismic_best_cnn.h5'}, split)
 
-labels = np.zeros(time_slices)
-labels[:time_slices // 2] = 1
-
-X_samples, y_samples = [], []
-for start in range(0, time_slices - window_size):
-    sample = spec[:, start:start + window_size]
-    if sample.shape == (spec.shape[0], window_size):
-        X_samples.append(sample)
-        y_samples.append(labels[start + window_size // 2])
-X_samples = np.array(X_samples)[..., np.newaxis]
-y_samples = np.array(y_samples)
-
-from sklearn.model_selection import train_test_split
-X_train, X_test, y_train, y_test = train_test_split(X_samples, y_samples, test_size=0.2, random_state=42)
-
-# Predict on test set
-y_pred = model.predict(X_test)
-y_pred_binary = (y_pred.flatten() > 0.5).astype(int)
+y_test = split.y
+y_pred_binary = (result['y_pred_proba'] > 0.5).astype(int)
 
 print("Accuracy:", accuracy_score(y_test, y_pred_binary))
 print("Precision:", precision_score(y_test, y_pred_binary))
@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+
+import numpy as np
+import tensorflow as tf
+from sklearn.metrics import accuracy_score, f1_score
+
+from inference_engine import QUANTIZATIONS, TFLiteEngine, parity_report_path, tflite_path
+from windowing import WINDOW_SIZE, spectrogram_windows, half_labels, window_labels, split_indices, take
+
+# Converts the deployed Keras models to TFLite artifacts for the lightweight
+# serving backend (HAZARD_BACKEND=tflite) and checks each artifact against
+# its Keras model on the same test split as compare_models.py (the storm
+# split of evaluate_cyclone_gru.py for the cyclone model).
+#
+#   float32  plain conversion
+#   float16  float16 weights, about half the size, float32 compute on CPU
+#   dynamic  int8 weights, activations quantised on the fly
+#   int8     int8 weights and activations calibrated on training windows;
+#            ops without an int8 kernel stay in float
+#
+# Writes models/<name>.<quantization>.tflite and a .json parity report next
+# to it, only for artifacts that pass; HAZARD_BACKEND=auto serves an
+# artifact only if its report says so. Exits non-zero if an artifact loses
+# more than --max-accuracy-drop or a model fails to export.
+#
+# Usage (from the repo root):
+#   python scripts/export_tflite.py --quantization float16 int8
+
+MODELS = {
+    'seismic_gru': ('models/seismic_best_gru.h5', 'seismic', 'rnn'),
+    'seismic_cnn': ('models/seismic_best_cnn.h5', 'seismic', 'cnn'),
+    'cyclone_gru': ('models/cyclone_best_gru.h5', 'cyclone', 'rnn'),
+}
+SPECTROGRAM = 'data/seismic/spectrogram.npy'
+REPRESENTATIVE_WINDOWS = 256
+
+
+def seismic_split(layout):
+    # (train windows view, train indices, test X, test y), as in compare_models.py
+    spec = np.load(SPECTROGRAM, mmap_mode='r')
+    windows = spectrogram_windows(spec, WINDOW_SIZE, layout)
+    y_samples = window_labels(half_labels(spec.shape[1]), WINDOW_SIZE)
+    train_idx, test_idx = split_indices(len(y_samples))
+    return windows, train_idx, take(windows, test_idx), y_samples[test_idx]
+
+
+def cyclone_split(layout):
+    from cyclone_features import load_windows, storm_split
+
+    X_samples, windows = load_windows()
+    train_idx, test_idx = storm_split(windows)
+    starts = windows['start']
+    return X_samples, starts[train_idx], take(X_samples, starts[test_idx]), windows['label'][test_idx]
+
+
+def unrolled(model):
+    # Copy of the model with its recurrent layers unrolled over the fixed
+    # 64-step window. The loop then converts to plain builtin ops instead of
+    # TensorList ops, which need the TensorFlow (Flex) kernels at runtime.
+    def clone(layer):
+        config = layer.get_config()
+        if 'unroll' in config:
+            config['unroll'] = True
+        return layer.__class__.from_config(config)
+
+    copy = tf.keras.models.clone_model(model, clone_function=clone)
+    copy.set_weights(model.get_weights())
+    return copy
+
+
+def convert(model, input_shape, quantization, representative=None):
+    # Converted from a concrete function with an unknown batch dimension, so
+    # the serving engine can resize the input to any batch. Builtin ops only:
+    # the artifact runs on tflite_runtime without TensorFlow.
+    model = unrolled(model)
+    forward = tf.function(lambda x: model(x, training=False))
+    concrete = forward.get_concrete_function(tf.TensorSpec((None,) + tuple(input_shape), tf.float32))
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete])
+
+    if quantization != 'float32':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        converter.representative_dataset = lambda: ([sample[np.newaxis]] for sample in representative)
+    return converter.convert()
+
+
+def predict_in_batches(predict, X, batch_size=256):
+    return np.concatenate([np.asarray(predict(X[i:i + batch_size])).reshape(-1)
+                           for i in range(0, len(X), batch_size)])
+
+
+def parity(y_test, keras_proba, tflite_proba):
+    keras_pred = (keras_proba > 0.5).astype(int)
+    tflite_pred = (tflite_proba > 0.5).astype(int)
+    return {
+        'keras_accuracy': float(accuracy_score(y_test, keras_pred)),
+        'tflite_accuracy': float(accuracy_score(y_test, tflite_pred)),
+        'keras_f1': float(f1_score(y_test, keras_pred, zero_division=0)),
+        'tflite_f1': float(f1_score(y_test, tflite_pred, zero_division=0)),
+        'prediction_agreement': float(np.mean(keras_pred == tflite_pred)),
+        'finite': bool(np.all(np.isfinite(tflite_proba))),
+        'max_abs_diff': float(np.max(np.abs(keras_proba - tflite_proba))),
+        'mean_abs_diff': float(np.mean(np.abs(keras_proba - tflite_proba))),
+    }
+
+
+def export_model(name, quantizations, max_accuracy_drop):
+    model_path, hazard, layout = MODELS[name]
+    model = tf.keras.models.load_model(model_path, compile=False)
+    input_shape = tuple(model.input_shape[1:])
+
+    train_view, train_idx, X_test, y_test = (seismic_split if hazard == 'seismic' else cyclone_split)(layout)
+    rng = np.random.default_rng(0)
+    calibration = rng.choice(train_idx, size=min(REPRESENTATIVE_WINDOWS, len(train_idx)), replace=False)
+    representative = take(train_view, np.sort(calibration)).astype(np.float32)
+
+    keras_proba = predict_in_batches(lambda x: model(x, training=False), X_test)
+
+    ok = True
+    for quantization in quantizations:
+        try:
+            report = export_artifact(model, model_path, input_shape, quantization, representative,
+                                     X_test, y_test, keras_proba, max_accuracy_drop)
+        except Exception as e:
+            traceback.print_exc()
+            print(f"❌ {name} {quantization}: {e}")
+            ok = False
+            continue
+        ok &= report['passed']
+        print("{:<12} {:<8} acc {:.4f} -> {:.4f}  agree {:.4f}  max|diff| {:.4f}  {}".format(
+            name, quantization, report['keras_accuracy'], report['tflite_accuracy'],
+            report['prediction_agreement'], report['max_abs_diff'], 'ok' if report['passed'] else 'FAILED'))
+    return ok
+
+
+def export_artifact(model, model_path, input_shape, quantization, representative, X_test, y_test, keras_proba,
+                    max_accuracy_drop):
+    # Converts and checks under a temporary name. Only an artifact that
+    # passed replaces models/<name>.<quantization>.tflite, after its report;
+    # a failed one leaves the previous artifact in place and its report in
+    # <name>.<quantization>.failed.json.
+    out = tflite_path(model_path, quantization)
+    tmp_path = out + '.tmp'
+    try:
+        started = time.time()
+        with open(tmp_path, 'wb') as f:
+            f.write(convert(model, input_shape, quantization, representative))
+        convert_s = time.time() - started
+
+        engine = TFLiteEngine(tmp_path, input_shape, warmup_batch_sizes=(1,))
+        report = {'model': model_path, 'artifact': out, 'quantization': quantization,
+                  'convert_s': convert_s, 'test_windows': int(len(y_test)),
+                  **parity(y_test, keras_proba, predict_in_batches(engine.predict, X_test))}
+        report['accuracy_drop'] = report['keras_accuracy'] - report['tflite_accuracy']
+        report['passed'] = report['finite'] and report['accuracy_drop'] <= max_accuracy_drop
+
+        report_path = parity_report_path(out) if report['passed'] else out[:-len('.tflite')] + '.failed.json'
+        with open(report_path + '.tmp', 'w') as f:
+            json.dump(report, f, indent=1)
+        os.replace(report_path + '.tmp', report_path)
+        if report['passed']:
+            os.replace(tmp_path, out)
+        return report
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the deployed models to TFLite and check accuracy parity')
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument('--quantization', nargs='+', choices=QUANTIZATIONS, default=['float16', 'int8'])
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01)
+    args = parser.parse_args()
+
+    ok = True
+    for name in args.models:
+        # One model failing to load or convert does not stop the others
+        try:
+            ok &= export_model(name, args.quantization, args.max_accuracy_drop)
+        except Exception as e:
+            traceback.print_exc()
+            print(f"❌ {name}: {e}")
+            ok = False
+    sys.exit(0 if ok else 1)
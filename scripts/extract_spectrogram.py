@@ -3,6 +3,8 @@ from obspy import read
 from scipy.signal import spectrogram
 import matplotlib.pyplot as plt
 
+from spectrogram_store import SpectrogramStore
+
 # Load seismic waveform
 seismic_file = 'data/seismic/12.037'
 stream = read(seismic_file)
@@ -32,3 +34,11 @@ plt.show()
 
 # Save spectrogram for ML use
 np.save('data/seismic/spectrogram.npy', Sxx_log)
+
+# Also add it to the multi-station store; column times are segment centres
+fs = trace.stats.sampling_rate
+store = SpectrogramStore()
+store.append(trace.id,
+             trace.stats.starttime.timestamp + (segment_length / 2) / fs,
+             Sxx_log,
+             dt=(segment_length - overlap) / fs)
@@ -0,0 +1,14 @@
+import hashlib
+
+# Content hash of a file, shared by the model registry and prediction cache
+# (model versions), the batch extractor's manifest and the backfill
+# checkpoints, so the same file gets the same hash everywhere.
+
+
+def file_hash(path):
+    # sha256 hex digest, read in 1 MB blocks
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,165 @@
+import argparse
+import os
+from datetime import datetime
+
+import netCDF4
+import numpy as np
+
+# Chunked IBTrACS reader.
+#
+# The NetCDF variables are read in slabs of storms and the validity mask is
+# applied per slab, so memory stays bounded on the full archive. Output is
+# one columnar observation file plus a per-storm index, both memory-mappable:
+#
+#   cyclone_tracks.npy   OBS_DTYPE, one row per valid observation, grouped by
+#                        storm and in time order
+#   cyclone_storms.npy   STORM_DTYPE, one row per storm with its sid, basin
+#                        and the offset/count of its rows in cyclone_tracks.npy
+
+NC_FILE = 'data/cyclone/datasettt.nc'
+TRACKS_FILE = 'data/cyclone/cyclone_tracks.npy'
+STORMS_FILE = 'data/cyclone/cyclone_storms.npy'
+
+OBS_DTYPE = np.dtype([
+    ('storm', '<i4'),   # row in cyclone_storms.npy
+    ('time', '<f8'),    # epoch seconds (NaN if the file has no time variable)
+    ('lat', '<f4'),
+    ('lon', '<f4'),
+    ('wind', '<f4'),    # wmo_wind, knots
+    ('pres', '<f4'),    # wmo_pres, hPa (NaN where missing)
+    ('dist2land', '<f4'),  # km, as reported by IBTrACS (NaN where missing)
+])
+STORM_DTYPE = np.dtype([
+    ('sid', 'U13'),
+    ('basin', 'U2'),
+    ('offset', '<i8'),
+    ('count', '<i8'),
+])
+
+CHUNK_STORMS = 512
+UNIT_SECONDS = {'days': 86400.0, 'hours': 3600.0, 'minutes': 60.0, 'seconds': 1.0}
+
+
+def _filled(ds, name, rows, dtype=np.float32):
+    # Slab of a (storm, date_time) variable with missing values as NaN;
+    # None if the file does not have the variable
+    if name not in ds.variables:
+        return None
+    values = ds.variables[name][rows]
+    return np.ma.filled(np.ma.asarray(values).astype(dtype), np.nan)
+
+
+def _epoch_seconds(ds, rows):
+    time = _filled(ds, 'time', rows, np.float64)
+    if time is None:
+        return None
+    units = ds.variables['time'].units
+    epoch = netCDF4.date2num(datetime(1970, 1, 1), units)
+    return (time - epoch) * UNIT_SECONDS[units.split()[0].lower()]
+
+
+def _strings(ds, name, rows):
+    if name not in ds.variables:
+        return None
+    return netCDF4.chartostring(np.ma.filled(ds.variables[name][rows], b''))
+
+
+def iter_chunks(nc_file=NC_FILE, chunk_storms=CHUNK_STORMS):
+    # Yields (observations, storms) per slab; observations['storm'] indexes
+    # the storms of that slab. Storms without valid observations are dropped.
+    ds = netCDF4.Dataset(nc_file)
+    try:
+        lat_var = ds.variables['lat']
+        if lat_var.ndim != 2:
+            raise ValueError(f"Expected IBTrACS (storm, date_time) variables, got lat with shape {lat_var.shape}")
+        n_storms = lat_var.shape[0]
+
+        for first in range(0, n_storms, chunk_storms):
+            rows = slice(first, min(n_storms, first + chunk_storms))
+            lat = _filled(ds, 'lat', rows)
+            lon = _filled(ds, 'lon', rows)
+            wind = _filled(ds, 'wmo_wind', rows)
+            pres = _filled(ds, 'wmo_pres', rows)
+            dist2land = _filled(ds, 'dist2land', rows)
+            time = _epoch_seconds(ds, rows)
+
+            # Filter out invalid values (e.g., -999.0 missings)
+            valid = (lat < 99) & (lon < 999) & (wind > 0)
+            storm_rows = np.nonzero(valid)[0]  # row-major: grouped by storm, in time order
+
+            counts = np.bincount(storm_rows, minlength=lat.shape[0])
+            kept = np.nonzero(counts)[0]
+            renumber = np.cumsum(counts > 0) - 1
+
+            obs = np.empty(len(storm_rows), dtype=OBS_DTYPE)
+            obs['storm'] = renumber[storm_rows]
+            obs['time'] = time[valid] if time is not None else np.nan
+            obs['lat'] = lat[valid]
+            obs['lon'] = lon[valid]
+            obs['wind'] = wind[valid]
+            obs['pres'] = pres[valid] if pres is not None else np.nan
+            obs['dist2land'] = dist2land[valid] if dist2land is not None else np.nan
+
+            storms = np.zeros(len(kept), dtype=STORM_DTYPE)
+            storms['count'] = counts[kept]
+            sid = _strings(ds, 'sid', rows)
+            if sid is not None:
+                storms['sid'] = sid[kept]
+            basin = _strings(ds, 'basin', (rows, 0))  # basin at genesis
+            if basin is not None:
+                storms['basin'] = basin[kept]
+            yield obs, storms
+    finally:
+        ds.close()
+
+
+def build_tracks(nc_file=NC_FILE, tracks_file=TRACKS_FILE, storms_file=STORMS_FILE, chunk_storms=CHUNK_STORMS):
+    # Observations are streamed to a raw temporary file, then copied into a
+    # .npy of the final length, so the archive is never held in memory
+    tmp_file = tracks_file + '.tmp'
+    storm_chunks, total = [], 0
+    with open(tmp_file, 'wb') as f:
+        for obs, storms in iter_chunks(nc_file, chunk_storms):
+            obs['storm'] += sum(len(chunk) for chunk in storm_chunks)
+            storms['offset'] = total + np.cumsum(storms['count']) - storms['count']
+            obs.tofile(f)
+            storm_chunks.append(storms)
+            total += len(obs)
+
+    tracks = np.lib.format.open_memmap(tracks_file, mode='w+', dtype=OBS_DTYPE, shape=(total,))
+    raw = np.memmap(tmp_file, dtype=OBS_DTYPE, mode='r', shape=(total,)) if total else np.empty(0, OBS_DTYPE)
+    for start in range(0, total, 1 << 20):
+        tracks[start:start + (1 << 20)] = raw[start:start + (1 << 20)]
+    tracks.flush()
+    del tracks, raw
+    os.remove(tmp_file)
+
+    storms = np.concatenate(storm_chunks) if storm_chunks else np.empty(0, STORM_DTYPE)
+    np.save(storms_file, storms)
+    return total, len(storms)
+
+
+def load_tracks(tracks_file=TRACKS_FILE, storms_file=STORMS_FILE, mmap_mode='r'):
+    return np.load(tracks_file, mmap_mode=mmap_mode), np.load(storms_file)
+
+
+def storm_track(tracks, storms, storm):
+    # O(1) slice of one storm's observations
+    offset, count = storms['offset'][storm], storms['count'][storm]
+    return tracks[offset:offset + count]
+
+
+def basin_storms(storms, basin):
+    return np.nonzero(storms['basin'] == basin)[0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert an IBTrACS NetCDF file into memory-mappable track files')
+    parser.add_argument('nc_file', nargs='?', default=NC_FILE)
+    parser.add_argument('--tracks', default=TRACKS_FILE)
+    parser.add_argument('--storms', default=STORMS_FILE)
+    parser.add_argument('--chunk-storms', type=int, default=CHUNK_STORMS)
+    args = parser.parse_args()
+
+    n_obs, n_storms = build_tracks(args.nc_file, args.tracks, args.storms, args.chunk_storms)
+    print(f"Wrote {n_obs} observations of {n_storms} storms to {args.tracks} / {args.storms}")
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# Window shapes the deployed models are served on (timesteps, features)
+SEISMIC_INPUT_SHAPE = (64, 129)
+CYCLONE_INPUT_SHAPE = (64, 6)
+
+WARMUP_BATCH_SIZES = (1, 32)
+
+# Artifacts written by export_tflite.py: models/<name>.<quantization>.tflite
+QUANTIZATIONS = ('float32', 'float16', 'dynamic', 'int8')
+
+
+class InferenceEngine:
+    # Wraps a loaded Keras model in a traced tf.function with a fixed input
+    # signature. Calling it skips the data adapter and callback loop that
+    # model.predict sets up on every call.
+    def __init__(self, model, input_shape, warmup_batch_sizes=WARMUP_BATCH_SIZES):
+        import tensorflow as tf
+
+        self.model = model
+        self.input_shape = tuple(input_shape)
+        self._forward = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(shape=(None,) + self.input_shape, dtype=tf.float32)],
+        )
+        self.warmup(warmup_batch_sizes)
+
+    def warmup(self, batch_sizes=WARMUP_BATCH_SIZES):
+        # Trace the graph and allocate buffers before the first real request
+        for batch_size in batch_sizes:
+            self._forward(np.zeros((batch_size,) + self.input_shape, dtype=np.float32))
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        if batch.shape[1:] != self.input_shape:
+            # Inputs outside the traced signature (e.g. single-row windows)
+            # take the eager path instead of retracing the graph
+            return self.model(batch, training=False).numpy()
+        return self._forward(batch).numpy()
+
+
+def tflite_interpreter(model_path, num_threads=None):
+    # tflite_runtime is a few MB and avoids importing TensorFlow; fall back
+    # to the interpreter bundled with TensorFlow
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=model_path, num_threads=num_threads)
+
+
+class TFLiteEngine:
+    # Same interface as InferenceEngine over a .tflite artifact. The
+    # interpreter is not thread-safe, so calls are serialised; the input is
+    # resized only when the batch shape changes.
+    model = None  # no Keras model: stateful streaming is not available
+
+    def __init__(self, model_path, input_shape, warmup_batch_sizes=WARMUP_BATCH_SIZES, num_threads=None):
+        self.model_path = model_path
+        self.input_shape = tuple(input_shape)
+        self._interpreter = tflite_interpreter(model_path, num_threads)
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._shape = None
+        self._lock = threading.Lock()
+        self.warmup(warmup_batch_sizes)
+
+    def warmup(self, batch_sizes=WARMUP_BATCH_SIZES):
+        for batch_size in batch_sizes:
+            self.predict(np.zeros((batch_size,) + self.input_shape, dtype=np.float32))
+
+    def _quantize(self, batch):
+        # Full-integer models take int8 inputs; float and fallback models
+        # take float32 directly
+        dtype = self._input['dtype']
+        if dtype == np.float32:
+            return batch
+        scale, zero_point = self._input['quantization']
+        return np.clip(np.round(batch / scale + zero_point), np.iinfo(dtype).min, np.iinfo(dtype).max).astype(dtype)
+
+    def _dequantize(self, output):
+        if output.dtype == np.float32:
+            return output
+        scale, zero_point = self._output['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape != self._shape:
+                self._interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self._interpreter.allocate_tensors()
+                self._shape = batch.shape
+            self._interpreter.set_tensor(self._input['index'], self._quantize(batch))
+            self._interpreter.invoke()
+            return self._dequantize(self._interpreter.get_tensor(self._output['index']).copy())
+
+
+def tflite_path(model_path, quantization='float16'):
+    # models/seismic_best_gru.h5 -> models/seismic_best_gru.float16.tflite
+    return f"{os.path.splitext(model_path)[0]}.{quantization}.tflite"
+
+
+def parity_report_path(artifact):
+    # export_tflite.py's report for an artifact that passed its parity check
+    return f"{os.path.splitext(artifact)[0]}.json"
+
+
+def parity_passed(artifact):
+    try:
+        with open(parity_report_path(artifact)) as f:
+            return json.load(f).get('passed') is True
+    except (OSError, ValueError):
+        return False
+
+
+def load_engine(model_path, input_shape=None, warmup_batch_sizes=WARMUP_BATCH_SIZES):
+    # input_shape=None takes the model's own input shape (without the batch)
+    if model_path.endswith('.tflite'):
+        if input_shape is None:
+            input_shape = tuple(tflite_interpreter(model_path).get_input_details()[0]['shape'][1:])
+        return TFLiteEngine(model_path, input_shape, warmup_batch_sizes)
+
+    import tensorflow as tf
+
+    # compile=False: optimizer and loss state are not needed for inference
+    model = tf.keras.models.load_model(model_path, compile=False)
+    if input_shape is None:
+        input_shape = tuple(model.input_shape[1:])
+    return InferenceEngine(model, input_shape, warmup_batch_sizes)
@@ -0,0 +1,131 @@
+import argparse
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Precomputed distance-to-land raster for the cyclone "distance to land"
+# feature, so scoring never does per-point geometry.
+#
+# The raster is a plain (n_lat + 1, n_lon) float32 .npy of distances in km
+# sampled on grid nodes lat = -90 + i * res, lon = -180 + j * res; the
+# resolution follows from the shape. It is memory-mapped on load and looked
+# up with vectorised bilinear interpolation (longitude wraps around).
+#
+# Build it offline from a local coastline file, e.g. GSHHG / Natural Earth
+# coastlines exported as "lon lat" points, and a land/sea mask so that, like
+# IBTrACS dist2land, points over land read 0:
+#   python scripts/land_distance.py build --coastline data/coastline.txt --land-mask data/land_mask.npy --resolution 0.25
+
+RASTER_FILE = 'data/cyclone/land_distance.npy'
+EARTH_RADIUS_KM = 6371.0
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+class LandDistanceRaster:
+    def __init__(self, grid):
+        self.grid = grid
+        self.resolution = 180.0 / (grid.shape[0] - 1)
+        if not np.isclose(grid.shape[1] * self.resolution, 360.0):
+            raise ValueError(f"Raster shape {grid.shape} is not a global grid")
+
+    @classmethod
+    def load(cls, path=RASTER_FILE):
+        return cls(np.load(path, mmap_mode='r'))
+
+    def lookup(self, lat, lon):
+        # Bilinear interpolation between the four surrounding grid nodes
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        n_lat, n_lon = self.grid.shape
+
+        y = (np.clip(lat, -90.0, 90.0) + 90.0) / self.resolution
+        i0 = np.clip(np.floor(y).astype(np.int64), 0, n_lat - 2)
+        fy = y - i0
+
+        x = ((lon + 180.0) % 360.0) / self.resolution
+        j0 = np.floor(x).astype(np.int64) % n_lon
+        j1 = (j0 + 1) % n_lon
+        fx = x - np.floor(x)
+
+        grid = self.grid
+        top = (1 - fx) * grid[i0, j0] + fx * grid[i0, j1]
+        bottom = (1 - fx) * grid[i0 + 1, j0] + fx * grid[i0 + 1, j1]
+        return ((1 - fy) * top + fy * bottom).astype(np.float32)
+
+
+def load_coastline(path):
+    # (n, 2) lon, lat points from a .npy or a text file; '#' comments and
+    # '>' segment separators (GMT multi-segment format) are skipped
+    if path.endswith('.npy'):
+        points = np.load(path)
+    else:
+        points = np.loadtxt(path, comments=['#', '>'], usecols=(0, 1),
+                            delimiter=',' if path.endswith('.csv') else None)
+    return points[np.all(np.isfinite(points), axis=1)]
+
+
+def load_land_mask(path):
+    # (rows, cols) global land/sea grid from a .npy file, nonzero over land:
+    # cells of 180 / rows by 360 / cols degrees, row 0 at the south pole and
+    # column 0 at 180W (np.flipud a north-up image first). Any resolution;
+    # e.g. a rasterised Natural Earth land layer, or ETOPO elevation > 0.
+    mask = np.load(path, mmap_mode='r')
+    if mask.ndim != 2:
+        raise ValueError(f"Land mask {path} has shape {mask.shape}, expected (rows, cols)")
+    return mask
+
+
+def land_at(mask, lat, lons):
+    # Land/sea of the mask cell containing each (lat, lon) point
+    rows, cols = mask.shape
+    row = min(int((lat + 90.0) / 180.0 * rows), rows - 1)
+    col = (((lons + 180.0) % 360.0) / 360.0 * cols).astype(np.int64) % cols
+    return np.asarray(mask[row])[col] != 0
+
+
+def build_raster(coastline, land_mask, resolution=0.25, out=RASTER_FILE):
+    # Great-circle distance from every sea node to the nearest coastline
+    # point, 0 at nodes the land mask marks as land. Accuracy is bounded by
+    # the coastline's point spacing and the mask's resolution.
+    tree = cKDTree(_unit_vectors(coastline[:, 1], coastline[:, 0]))
+    n_lat, n_lon = int(round(180 / resolution)) + 1, int(round(360 / resolution))
+    lons = -180.0 + np.arange(n_lon) * resolution
+
+    raster = np.lib.format.open_memmap(out, mode='w+', dtype=np.float32, shape=(n_lat, n_lon))
+    for i in range(n_lat):
+        lat = -90.0 + i * resolution
+        chord, _ = tree.query(_unit_vectors(np.full(n_lon, lat), lons), workers=-1)
+        distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+        distance[land_at(land_mask, lat, lons)] = 0.0
+        raster[i] = distance
+    raster.flush()
+    return LandDistanceRaster(raster)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or query the distance-to-land raster')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='Build the raster from a coastline file')
+    build.add_argument('--coastline', required=True, help='Coastline points (lon lat): .txt, .csv or .npy')
+    build.add_argument('--land-mask', required=True,
+                       help='Global land/sea .npy grid, nonzero over land, row 0 at the south pole')
+    build.add_argument('--resolution', type=float, default=0.25, help='Grid spacing in degrees')
+    build.add_argument('--out', default=RASTER_FILE)
+
+    lookup = subparsers.add_parser('lookup', help='Distance to land (km) at a point')
+    lookup.add_argument('lat', type=float)
+    lookup.add_argument('lon', type=float)
+    lookup.add_argument('--raster', default=RASTER_FILE)
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        raster = build_raster(load_coastline(args.coastline), load_land_mask(args.land_mask),
+                              args.resolution, args.out)
+        print(f"Wrote {raster.grid.shape} raster at {raster.resolution} degrees to {args.out}")
+    else:
+        print(float(LandDistanceRaster.load(args.raster).lookup(args.lat, args.lon)))
@@ -1,6 +1,9 @@
 import netCDF4
+import numpy as np
 import matplotlib.pyplot as plt
 
+from ibtracs_reader import iter_chunks
+
 # Path to your NetCDF file
 nc_file = 'data/cyclone/datasettt.nc'
 
@@ -10,9 +13,15 @@ dataset = netCDF4.Dataset(nc_file)
 # Print available variables (you can comment this out later)
 print(dataset.variables.keys())
 
-# Extract cyclone track Latitude and Longitude variables
-lats = dataset.variables['lat'][:]
-lons = dataset.variables['lon'][:]
+# Extract cyclone track Latitude and Longitude variables, one slab of storms
+# at a time with invalid points dropped
+dataset.close()
+lats, lons = [], []
+for obs, _ in iter_chunks(nc_file):
+    lats.append(obs['lat'])
+    lons.append(obs['lon'])
+lats = np.concatenate(lats)
+lons = np.concatenate(lons)
 
 # Plot cyclone track coordinates
 plt.figure(figsize=(10, 6))
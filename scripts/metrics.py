@@ -0,0 +1,261 @@
+import bisect
+import logging
+import os
+import random
+import threading
+import time
+
+from flask import Response, g, request
+
+# Minimal in-process metrics for the prediction servers, rendered in the
+# Prometheus text format at /metrics.
+#
+# Histograms have fixed buckets, so observing a value is a bisect and two
+# increments under a lock. Gauges can be backed by a function (e.g. a queue
+# depth) that is only called when /metrics is scraped.
+#
+# Payload logging is off by default; DEBUG_PAYLOAD_SAMPLE_RATE=0.01 logs a
+# summary (shape, range) of about 1% of request windows.
+
+# Seconds, from 100 us to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEBUG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('DEBUG_PAYLOAD_SAMPLE_RATE', 0))
+
+logger = logging.getLogger('hazard.payload')
+
+
+def _label_text(names, values, extra=''):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f'{self.name}{_label_text(self.labels, key)} {_number(value)}'
+                                for key, value in values]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn, **labels):
+        # fn() is evaluated at scrape time
+        with self._lock:
+            self._functions[self._key(labels)] = fn
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        return self.header() + [f'{self.name}{_label_text(self.labels, key)} {_number(value)}'
+                                for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [per-bucket counts (+Inf last), sum]
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = self.header()
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_text(self.labels, key)} {total!r}')
+            lines.append(f'{self.name}_count{_label_text(self.labels, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class _Stage:
+    __slots__ = ('histogram', 'route', 'stage', 'start')
+
+    def __init__(self, histogram, route, stage):
+        self.histogram, self.route, self.stage = histogram, route, stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, route=self.route, stage=self.stage)
+
+
+class StageTimer:
+    # with stages('parse'): ... records the block's duration for one route
+    def __init__(self, histogram, route):
+        self.histogram = histogram
+        self.route = route
+
+    def __call__(self, stage):
+        return _Stage(self.histogram, self.route, stage)
+
+
+class ServerMetrics:
+    # Standard metrics of one Flask app: request latency and count per route
+    # and status, in-flight requests, per-stage latency, and /metrics itself
+    def __init__(self, app, prefix='hazard'):
+        self.registry = Registry()
+        self.requests = self.registry.counter(f'{prefix}_requests_total', 'Requests served',
+                                              ('route', 'status'))
+        self.latency = self.registry.histogram(f'{prefix}_request_seconds', 'Request latency',
+                                               ('route',))
+        self.stage_latency = self.registry.histogram(f'{prefix}_stage_seconds', 'Latency of one request stage',
+                                                     ('route', 'stage'))
+        self.in_flight = self.registry.gauge(f'{prefix}_in_flight_requests', 'Requests being handled')
+
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+        app.add_url_rule('/metrics', 'metrics', self._render)
+
+        if DEBUG_PAYLOAD_SAMPLE_RATE > 0:
+            logger.setLevel(logging.DEBUG)
+            if not logger.handlers:
+                logger.addHandler(logging.StreamHandler())
+
+    def stages(self, route):
+        return StageTimer(self.stage_latency, route)
+
+    def _before(self):
+        g.metrics_start = time.perf_counter()
+        self.in_flight.inc()
+
+    def _after(self, response):
+        if response.is_streamed:
+            # The body (e.g. NDJSON) is generated after the request tears
+            # down, so the request is recorded once the server closes it
+            start = g.pop('metrics_start', None)
+            if start is not None:
+                route, status = self._route(), response.status_code
+                response.call_on_close(lambda: self._record(start, route, status))
+        else:
+            # teardown_request does not see the response, so keep its status
+            g.metrics_status = response.status_code
+        return response
+
+    def _teardown(self, exc):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            self._record(start, self._route(), g.pop('metrics_status', 500 if exc is not None else 200))
+
+    def _route(self):
+        return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    def _record(self, start, route, status):
+        self.in_flight.dec()
+        if route == '/metrics':
+            return
+        self.latency.observe(time.perf_counter() - start, route=route)
+        self.requests.inc(route=route, status=status)
+
+    def _render(self):
+        return Response(self.registry.render(), content_type=CONTENT_TYPE)
+
+
+def log_payload_sample(route, sample):
+    # Sampled, summarised payload logging for debugging; never the full body
+    if DEBUG_PAYLOAD_SAMPLE_RATE <= 0 or random.random() >= DEBUG_PAYLOAD_SAMPLE_RATE:
+        return
+    logger.debug('%s payload: shape=%s dtype=%s min=%.4g max=%.4g mean=%.4g', route, sample.shape,
+                 sample.dtype, float(sample.min()), float(sample.max()), float(sample.mean()))
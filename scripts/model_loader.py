@@ -0,0 +1,75 @@
+import threading
+import time
+import traceback
+
+from flask import jsonify
+
+# Background model loading for the prediction servers.
+#
+# Each model loads on its own thread (in parallel with the others), so a
+# server can bind its port straight away. /health answers as soon as the
+# process serves requests; /ready returns 503 until every model is loaded,
+# which is what load balancers and autoscalers should gate traffic on.
+
+PROCESS_START = time.monotonic()
+
+
+class ModelLoader:
+    def __init__(self, app):
+        self.status = {}   # name -> 'loading' | 'ready' | 'failed'
+        self.load_s = {}
+        self.errors = {}
+        self._threads = []
+        app.add_url_rule('/health', 'health', self._health)
+        app.add_url_rule('/ready', 'ready', self._ready)
+
+    def start(self, name, load_fn):
+        # load_fn() publishes the loaded model itself (e.g. sets a global)
+        self.status[name] = 'loading'
+        thread = threading.Thread(target=self._load, args=(name, load_fn), name=f'load-{name}', daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _load(self, name, load_fn):
+        start = time.monotonic()
+        try:
+            load_fn()
+            self.status[name] = 'ready'
+            print(f"✅ Loaded {name} model in {time.monotonic() - start:.1f}s")
+        except Exception as e:
+            traceback.print_exc()
+            self.errors[name] = str(e)
+            self.status[name] = 'failed'
+            print(f"❌ Failed to load {name} model: {e}")
+        finally:
+            self.load_s[name] = time.monotonic() - start
+
+    def wait(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def ready(self):
+        return all(status == 'ready' for status in self.status.values())
+
+    def unavailable(self, name, label=None):
+        # Response for a request that needs a model that is not loaded
+        label = label or f'{name.capitalize()} model'
+        if self.status.get(name) == 'loading':
+            response = jsonify({'error': f'{label} is still loading'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        return jsonify({'error': f'{label} not loaded'}), 500
+
+    def report(self):
+        return {
+            'ready': self.ready(),
+            'uptime_s': time.monotonic() - PROCESS_START,
+            'models': {name: {'status': status, 'load_s': self.load_s.get(name), 'error': self.errors.get(name)}
+                       for name, status in self.status.items()},
+        }
+
+    def _health(self):
+        return jsonify({'status': 'ok'})
+
+    def _ready(self):
+        return jsonify(self.report()), 200 if self.ready() else 503
@@ -0,0 +1,263 @@
+import json
+import os
+import random
+import threading
+import time
+import traceback
+
+from prediction_cache import model_version
+
+# Model registry for the prediction servers.
+#
+# Each hazard has a primary model and, optionally, a candidate that gets a
+# percentage of the traffic (e.g. the CNN or LSTM from compare_models.py
+# next to the deployed GRU). Which files those are comes from
+# <model_dir>/routing.json, falling back to the defaults the server passes:
+#
+#   {"earthquake": {"primary": "seismic_best_gru.h5",
+#                   "candidate": "seismic_best_cnn.h5", "candidate_percent": 10}}
+#
+# A background thread polls the routing file and the model files. When a
+# file changes (and has stopped changing for one poll, so a half-copied
+# file is not loaded), the new version is loaded and warmed on its own
+# thread while the current one keeps serving, then swapped in with a single
+# reference assignment. The old version is closed after RETIRE_GRACE_S, once
+# the requests that picked it up have finished.
+#
+# Copy new models in with a rename (cp new.h5 models/.tmp && mv ...) so the
+# file never appears half-written under its real name.
+
+ROUTING_FILE = 'routing.json'
+RETIRE_GRACE_S = 30.0
+
+
+def file_signature(path):
+    # Cheap change check; the content hash is only taken once this changes
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def candidate_percent(hazard, entry):
+    # 0 without a candidate, or when the value is not a number in [0, 100]
+    # (a typo in routing.json must not take the server down)
+    if not entry.get('candidate'):
+        return 0.0
+    value = entry.get('candidate_percent', 0)
+    try:
+        percent = float(value)
+    except (TypeError, ValueError):
+        percent = float('nan')
+    if not 0 <= percent <= 100:
+        print(f"⚠️ Ignoring candidate_percent {value!r} for {hazard}: expected a number from 0 to 100")
+        return 0.0
+    return percent
+
+
+class ServedModel:
+    # One loaded version of a model: the engine, plus the batcher, cache and
+    # anything else built around it. adapt() reshapes the windows the routes
+    # accept into the model's own layout (e.g. GRU windows for a CNN).
+    def __init__(self, hazard, role, path, version, engine, adapt=None):
+        self.hazard = hazard
+        self.role = role
+        self.path = path
+        self.version = version
+        self.engine = engine
+        self.adapt = adapt
+        self.batcher = None
+        self.cache = None
+        self.streams = None
+        self.loaded_at = time.time()
+
+    def predict(self, batch):
+        return self.engine.predict(self.adapt(batch) if self.adapt else batch)
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def info(self):
+        return {'path': self.path, 'version': self.version, 'loaded_at': self.loaded_at,
+                'cache': self.cache.stats() if self.cache is not None else None}
+
+
+class _Slot:
+    def __init__(self, hazard, role, filename):
+        self.hazard = hazard
+        self.role = role
+        self.filename = filename
+        self.served = None
+        self.signature = None   # of the file self.served was loaded from
+        self.pending = None     # changed signature seen on the last poll
+        self.loading = False
+        self.error = None
+
+
+class ModelRegistry:
+    # build(hazard, role, path, version) loads and warms a ServedModel;
+    # resolve(path) maps a routing entry to the file to load (e.g. its
+    # TFLite artifact).
+    def __init__(self, model_dir, defaults, build, resolve=None, poll_s=5.0):
+        self.model_dir = model_dir
+        self.defaults = defaults   # hazard -> primary filename
+        self.build = build
+        self.resolve = resolve or (lambda path: path)
+        self.poll_s = poll_s
+        self.percent = {}          # hazard -> share of traffic for the candidate
+        self._slots = {}           # (hazard, role) -> _Slot
+        self._lock = threading.Lock()
+        self._loader = None
+        self._routing_signature = file_signature(self.routing_path)
+        self._apply_routing(self._read_routing())
+
+    @property
+    def routing_path(self):
+        return os.path.join(self.model_dir, ROUTING_FILE)
+
+    def path(self, slot):
+        return self.resolve(os.path.join(self.model_dir, slot.filename))
+
+    def _read_routing(self):
+        routing = {hazard: {'primary': filename} for hazard, filename in self.defaults.items()}
+        if os.path.exists(self.routing_path):
+            try:
+                with open(self.routing_path) as f:
+                    for hazard, entry in json.load(f).items():
+                        routing.setdefault(hazard, {}).update(entry)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Ignoring {self.routing_path}: {e}")
+        return routing
+
+    def _apply_routing(self, routing):
+        # Returns the slots whose file changed and need a load
+        changed = []
+        with self._lock:
+            for hazard, entry in routing.items():
+                self.percent[hazard] = candidate_percent(hazard, entry)
+                for role in ('primary', 'candidate'):
+                    filename = entry.get(role)
+                    slot = self._slots.get((hazard, role))
+                    if not filename:
+                        if slot is not None:
+                            del self._slots[(hazard, role)]
+                            self._retire(slot.served)
+                        continue
+                    if slot is None:
+                        slot = self._slots[(hazard, role)] = _Slot(hazard, role, filename)
+                    elif slot.filename != filename:
+                        slot.filename, slot.signature, slot.pending = filename, None, None
+                    else:
+                        continue
+                    changed.append(slot)
+        return changed
+
+    def get(self, hazard, role='primary'):
+        slot = self._slots.get((hazard, role))
+        return slot.served if slot is not None else None
+
+    def route(self, hazard):
+        # The candidate for candidate_percent of the calls, else the primary
+        candidate = self.get(hazard, 'candidate')
+        if candidate is not None and random.random() * 100 < self.percent.get(hazard, 0):
+            return candidate
+        return self.get(hazard)
+
+    def served(self):
+        return [slot.served for slot in list(self._slots.values()) if slot.served is not None]
+
+    def start(self, loader):
+        # Primaries load through the ModelLoader, so /ready waits for them;
+        # candidates load alongside without holding up readiness
+        self._loader = loader
+        for slot in list(self._slots.values()):
+            if slot.role == 'primary':
+                slot.loading = True
+                loader.start(slot.hazard, lambda slot=slot: self._load(slot, raise_errors=True))
+            else:
+                self._load_in_background(slot)
+        threading.Thread(target=self._watch, name='model-registry', daemon=True).start()
+
+    def _load_in_background(self, slot):
+        slot.loading = True
+        threading.Thread(target=self._load, args=(slot,), name=f'load-{slot.hazard}-{slot.role}',
+                         daemon=True).start()
+
+    def _load(self, slot, raise_errors=False):
+        path = self.path(slot)
+        signature = file_signature(path)
+        try:
+            version = model_version(path)
+            current = slot.served
+            if current is not None and current.version == version and current.path == path:
+                slot.signature = signature   # touched, not changed
+                return
+            start = time.monotonic()
+            served = self.build(slot.hazard, slot.role, path, version)
+            slot.served, slot.signature, slot.error = served, signature, None
+            self._retire(current)
+            if slot.role == 'primary' and self._loader.status.get(slot.hazard) == 'failed':
+                # A fixed file was dropped in after the first load failed
+                self._loader.status[slot.hazard] = 'ready'
+                self._loader.errors.pop(slot.hazard, None)
+            if current is not None:
+                print(f"🔁 {slot.hazard} {slot.role}: {current.version} -> {version} "
+                      f"({time.monotonic() - start:.1f}s to load)")
+        except Exception as e:
+            # Not retried until the file changes again
+            slot.signature, slot.error = signature, str(e)
+            if raise_errors:
+                raise
+            traceback.print_exc()
+            print(f"❌ Failed to load {slot.hazard} {slot.role} from {slot.filename}: {e}")
+        finally:
+            slot.loading = False
+
+    def _retire(self, served):
+        if served is not None:
+            timer = threading.Timer(RETIRE_GRACE_S, served.close)
+            timer.daemon = True
+            timer.start()
+
+    def poll(self):
+        signature = file_signature(self.routing_path)
+        if signature != self._routing_signature:
+            self._routing_signature = signature
+            for slot in self._apply_routing(self._read_routing()):
+                # A slot still loading its previous file is picked up by the
+                # signature check below once that load has finished
+                if not slot.loading:
+                    self._load_in_background(slot)
+
+        for slot in list(self._slots.values()):
+            if slot.loading:
+                continue
+            signature = file_signature(self.path(slot))
+            if signature is None or signature == slot.signature:
+                slot.pending = None
+            elif signature == slot.pending:
+                # Unchanged since the last poll: the copy has finished
+                slot.pending = None
+                self._load_in_background(slot)
+            else:
+                slot.pending = signature
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_s)
+            try:
+                self.poll()
+            except Exception:
+                traceback.print_exc()
+
+    def status(self):
+        models = {}
+        for (hazard, role), slot in sorted(self._slots.items()):
+            entry = {'file': slot.filename, 'loading': slot.loading, 'error': slot.error,
+                     **(slot.served.info() if slot.served is not None else {'version': None})}
+            if role == 'candidate':
+                entry['percent'] = self.percent.get(hazard, 0)
+            models.setdefault(hazard, {})[role] = entry
+        return models
@@ -0,0 +1,189 @@
+import io
+import math
+
+import numpy as np
+
+# Binary request bodies accepted next to the JSON {"spectrogram": [[...]]} form:
+#   application/octet-stream  raw little-endian float32, shape in the X-Shape
+#                             header as comma-separated dims, e.g. "64,129"
+#   application/x-npy         bytes written by np.save
+RAW_CONTENT_TYPE = 'application/octet-stream'
+NPY_CONTENT_TYPE = 'application/x-npy'
+SHAPE_HEADER = 'X-Shape'
+
+RAW_DTYPE = np.dtype('<f4')
+
+# Columns per row of the windows each hazard's routes accept (64 rows)
+HAZARD_FEATURES = {'cyclone': 6, 'earthquake': 129}
+WINDOW_ROWS = 64
+
+
+class PayloadError(ValueError):
+    # details are returned to the client next to the error message
+    def __init__(self, message, **details):
+        super().__init__(message)
+        self.details = details
+
+    def to_dict(self):
+        return {'error': str(self), **self.details}
+
+
+def is_binary_request(request):
+    return request.mimetype in (RAW_CONTENT_TYPE, NPY_CONTENT_TYPE)
+
+
+def decode_raw(body, shape_header):
+    if not shape_header:
+        raise PayloadError(f"Missing '{SHAPE_HEADER}' header for raw float32 body")
+    try:
+        shape = tuple(int(dim) for dim in shape_header.split(','))
+    except ValueError:
+        raise PayloadError(f"Invalid '{SHAPE_HEADER}' header: {shape_header!r}", shape_header=shape_header)
+    if any(dim <= 0 for dim in shape):
+        raise PayloadError(f"'{SHAPE_HEADER}' dimensions must be positive", received_shape=list(shape))
+    # Python ints: no overflow for absurd dimensions
+    expected_bytes = math.prod(shape) * RAW_DTYPE.itemsize
+    if len(body) != expected_bytes:
+        raise PayloadError(f"Body has {len(body)} bytes, shape {shape} needs {expected_bytes}",
+                           received_shape=list(shape), received_bytes=len(body))
+    # Zero-copy view over the request body
+    return np.frombuffer(body, dtype=RAW_DTYPE).reshape(shape)
+
+
+def decode_npy(body):
+    stream = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    except ValueError as e:
+        raise PayloadError(f"Invalid .npy body: {e}")
+    if dtype.kind != 'f':
+        raise PayloadError(f"Expected a floating point array, got dtype {dtype}")
+
+    count = int(np.prod(shape))
+    if len(body) - stream.tell() != count * dtype.itemsize:
+        raise PayloadError(f"Truncated .npy body for shape {shape}")
+    array = np.frombuffer(body, dtype=dtype, count=count, offset=stream.tell())
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def decode_binary(request):
+    body = request.get_data(cache=False)
+    if request.mimetype == NPY_CONTENT_TYPE:
+        return decode_npy(body)
+    return decode_raw(body, request.headers.get(SHAPE_HEADER))
+
+
+def valid_shape(shape, expected_rows=64, expected_cols=None):
+    # 64 (or 1) rows of expected_cols values
+    return len(shape) == 2 and shape[0] in (1, expected_rows) and shape[1] == expected_cols
+
+
+def window_from_json(data):
+    # One pass: NumPy builds the float32 array straight from the nested lists
+    # and rejects ragged rows or non-numeric values while doing so
+    if not isinstance(data, list):
+        raise PayloadError("'spectrogram' must be a list of rows")
+    try:
+        return np.array(data, dtype=np.float32)
+    except (TypeError, ValueError):
+        raise PayloadError("'spectrogram' rows must be equal-length lists of numbers")
+
+
+def check_finite(sample):
+    if sample.dtype != np.float32:
+        sample = sample.astype(np.float32)
+    finite = np.isfinite(sample)
+    if not finite.all():
+        raise PayloadError("Input contains NaN or infinite values",
+                           non_finite_values=int(finite.size - np.count_nonzero(finite)))
+    return sample
+
+
+def check_window(sample, expected_rows=64, expected_cols=None):
+    if not valid_shape(sample.shape, expected_rows, expected_cols):
+        raise PayloadError(f"Input must be {expected_rows} rows (or 1 row) with {expected_cols} columns",
+                           expected_shape=[expected_rows, expected_cols],
+                           received_shape=list(sample.shape))
+    return check_finite(sample)
+
+
+def check_columns(sample, expected_cols, max_rows):
+    # 1..max_rows new timesteps of expected_cols values (streaming pushes)
+    if sample.ndim != 2 or not 1 <= sample.shape[0] <= max_rows or sample.shape[1] != expected_cols:
+        raise PayloadError(f"Input must be 1 to {max_rows} rows with {expected_cols} columns",
+                           expected_shape=[max_rows, expected_cols],
+                           received_shape=list(sample.shape))
+    return check_finite(sample)
+
+
+def check_windows(batch, expected_rows=64, expected_cols=None, max_windows=None):
+    # (N, 64 or 1, expected_cols) stack of windows for the bulk endpoints;
+    # the shape and finiteness are checked once for the whole stack
+    if batch.ndim != 3 or not valid_shape(batch.shape[1:], expected_rows, expected_cols) or batch.shape[0] < 1:
+        raise PayloadError(f"Input must be a non-empty stack of {expected_rows}-row (or 1-row) windows "
+                           f"with {expected_cols} columns",
+                           expected_shape=[None, expected_rows, expected_cols],
+                           received_shape=list(batch.shape))
+    if max_windows is not None and batch.shape[0] > max_windows:
+        raise PayloadError(f"At most {max_windows} windows per request",
+                           max_windows=max_windows, received_windows=int(batch.shape[0]))
+    return check_finite(batch)
+
+
+def max_body_bytes(max_windows):
+    # Request body limit shared by deploy_both.py and serve.py's front end:
+    # the largest bulk request, /predict/batch/all with max_windows float32
+    # windows of every hazard, plus 1 MB for headers and framing. JSON bodies
+    # are larger per window, so they reach this limit with fewer windows.
+    window_bytes = WINDOW_ROWS * sum(HAZARD_FEATURES.values()) * RAW_DTYPE.itemsize
+    return max_windows * window_bytes + (1 << 20)
+
+
+def parse_body(request, key='spectrogram'):
+    # Binary bodies decode straight to an array; JSON bodies to nested lists
+    if is_binary_request(request):
+        return decode_binary(request)
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or body.get(key) is None:
+        raise PayloadError(f"Missing '{key}' key")
+    return body[key]
+
+
+def parse_hazards(request, hazards):
+    # Fused requests: one JSON object keyed by hazard, e.g.
+    # {"cyclone": [[...]], "earthquake": [[...]]}; any subset of hazards
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise PayloadError("Body must be a JSON object keyed by hazard")
+    found = {hazard: body[hazard] for hazard in hazards if body.get(hazard) is not None}
+    if not found:
+        raise PayloadError(f"Expected at least one of {', '.join(map(repr, hazards))}")
+    return found
+
+
+def to_array(data):
+    return data if isinstance(data, np.ndarray) else window_from_json(data)
+
+
+def read_array(request, key='spectrogram'):
+    # Decodes a JSON or binary array without validating its shape
+    return to_array(parse_body(request, key))
+
+
+# Client-side helpers returning (body, headers) for requests.post
+
+def encode_raw(array):
+    array = np.ascontiguousarray(array, dtype=RAW_DTYPE)
+    headers = {'Content-Type': RAW_CONTENT_TYPE,
+               SHAPE_HEADER: ','.join(str(dim) for dim in array.shape)}
+    return array.tobytes(), headers
+
+
+def encode_npy(array):
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(array, dtype=np.float32))
+    return buffer.getvalue(), {'Content-Type': NPY_CONTENT_TYPE}
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from hashing import file_hash
+
+# Result cache for the single-window predict routes.
+#
+# Keys are a BLAKE2b digest of the model version and the float32 window
+# (shape and bytes), so a retrained model never serves stale scores and
+# JSON and binary copies of the same window share an entry. Entries are a
+# key and a float, so max_entries bounds the memory used.
+#
+# SharedPredictionCache adds a SQLite file next to the in-process LRU so the
+# worker processes of serve.py see each other's results; put it on local
+# disk or tmpfs (e.g. /dev/shm).
+
+DEFAULT_MAX_ENTRIES = 65536
+
+
+def model_version(path):
+    # Short content hash of a model file, so keys change when the model does
+    return file_hash(path)[:16]
+
+
+class PredictionCache:
+    def __init__(self, version, max_entries=DEFAULT_MAX_ENTRIES):
+        self.version = version.encode()
+        self.max_entries = max_entries
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, sample):
+        sample = np.ascontiguousarray(sample, dtype=np.float32)
+        digest = hashlib.blake2b(self.version, digest_size=16)
+        digest.update(np.asarray(sample.shape, dtype=np.int64).tobytes())
+        digest.update(sample.data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        # Cached probability, or None
+        with self._lock:
+            probability = self._entries.get(key)
+            if probability is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return probability
+
+    def put(self, key, probability):
+        with self._lock:
+            self._remember(key, probability)
+
+    def _remember(self, key, probability):
+        self._entries[key] = probability
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+
+
+class SharedPredictionCache(PredictionCache):
+    # In-process LRU in front of a SQLite table shared by every process that
+    # opens the same path. The table is trimmed back to max_entries, least
+    # recently used first, every max_entries / 10 writes.
+    def __init__(self, version, path, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(version, max_entries)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self.shared_evictions = 0
+        db = self._db()
+        db.execute("CREATE TABLE IF NOT EXISTS predictions "
+                   "(key TEXT PRIMARY KEY, probability REAL NOT NULL, used REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS predictions_used ON predictions (used)")
+
+    def _db(self):
+        # SQLite connections cannot be shared between threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        with self._lock:
+            probability = self._entries.get(key)
+            if probability is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return probability
+
+        db = self._db()
+        row = db.execute("SELECT probability FROM predictions WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, row[0])
+        db.execute("UPDATE predictions SET used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key, probability):
+        super().put(key, probability)
+        db = self._db()
+        db.execute("INSERT OR REPLACE INTO predictions (key, probability, used) VALUES (?, ?, ?)",
+                   (key, probability, time.time()))
+        with self._lock:
+            self._writes += 1
+            trim = self._writes % max(1, self.max_entries // 10) == 0
+        if trim:
+            self._trim(db)
+
+    def _trim(self, db):
+        (count,) = db.execute("SELECT COUNT(*) FROM predictions").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            db.execute("DELETE FROM predictions WHERE key IN "
+                       "(SELECT key FROM predictions ORDER BY used LIMIT ?)", (excess,))
+            with self._lock:
+                self.shared_evictions += excess
+
+    def stats(self):
+        stats = super().stats()
+        (stats['shared_entries'],) = self._db().execute("SELECT COUNT(*) FROM predictions").fetchone()
+        stats['shared_evictions'] = self.shared_evictions
+        stats['shared_path'] = self.path
+        return stats
+
+
+def make_cache(model_path, max_entries=DEFAULT_MAX_ENTRIES, shared_path=None, version=None):
+    # None when caching is disabled (max_entries <= 0)
+    if max_entries <= 0:
+        return None
+    version = version or model_version(model_path)
+    if shared_path:
+        return SharedPredictionCache(version, shared_path, max_entries)
+    return PredictionCache(version, max_entries)
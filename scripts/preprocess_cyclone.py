@@ -1,19 +1,16 @@
-import netCDF4
 import numpy as np
 import matplotlib.pyplot as plt
 
-# Load IBTrACS NetCDF file
-nc_file = 'data/cyclone/datasettt.nc'
-ds = netCDF4.Dataset(nc_file)
+from ibtracs_reader import NC_FILE, build_tracks, load_tracks
 
-# Extract variables for one storm (first in set for simplicity)
-lats = ds.variables['lat'][:]   # shape: [obs,]
-lons = ds.variables['lon'][:]
-winds = ds.variables['wmo_wind'][:]
+# Load IBTrACS NetCDF file in slabs of storms into per-storm indexed,
+# memory-mappable track files (cyclone_tracks.npy / cyclone_storms.npy)
+n_obs, n_storms = build_tracks(NC_FILE)
+print(f"Valid observations: {n_obs} in {n_storms} storms")
 
-# Filter out invalid values (e.g., -999.0 missings)
-valid_idx = (lats < 99) & (lons < 999) & (winds > 0)  # Adjust as necessary
-lats, lons, winds = lats[valid_idx], lons[valid_idx], winds[valid_idx]
+# Invalid values (e.g., -999.0 missings) were filtered per slab
+tracks, storms = load_tracks()
+lats, lons, winds = tracks['lat'], tracks['lon'], tracks['wind']
 
 # Plot cyclone tracks (all valid points)
 plt.figure(figsize=(10, 6))
@@ -25,14 +22,7 @@ plt.ylabel('Latitude')
 plt.grid(True)
 plt.show()
 
-# Save preprocessed arrays for ML
-lats_filled = lats.astype(float).filled(np.nan)
-lons_filled = lons.astype(float).filled(np.nan)
-winds_filled = winds.astype(float).filled(np.nan)
-
-np.save('data/cyclone/cyclone_lats.npy', lats_filled)
-np.save('data/cyclone/cyclone_lons.npy', lons_filled)
-np.save('data/cyclone/cyclone_winds.npy', winds_filled)
-
-
-
+# Save flat arrays used by train_cyclone_model.py
+np.save('data/cyclone/cyclone_lats.npy', lats.astype(float))
+np.save('data/cyclone/cyclone_lons.npy', lons.astype(float))
+np.save('data/cyclone/cyclone_winds.npy', winds.astype(float))
@@ -0,0 +1,123 @@
+import numpy as np
+import tensorflow as tf
+
+from spectrogram_store import SpectrogramStore
+from windowing import WINDOW_SIZE, spectrogram_windows, half_labels, window_labels, split_indices
+
+# Input pipeline shared by the seismic CNN, LSTM and GRU trainers.
+#
+# Spectrograms are memory-mapped and windows are strided views over them, so
+# the dataset size is bounded by disk, not host RAM. With --tf-data, batches
+# of window indices are gathered on the fly in parallel map calls and
+# prefetched while the model trains; otherwise the split is materialised in
+# memory as before.
+
+DEFAULT_SPECTROGRAM = 'data/seismic/spectrogram.npy'
+
+
+class WindowSource:
+    # Flat index over every window of one or more spectrograms. Sources are
+    # .npy paths (memory-mapped) or (freq, time) arrays, e.g. store ranges.
+    def __init__(self, spectrograms, layout='rnn', window_size=WINDOW_SIZE):
+        self.windows, self.labels = [], []
+        for spec in spectrograms:
+            if isinstance(spec, str):
+                spec = np.load(spec, mmap_mode='r')
+            if spec.shape[1] <= window_size:
+                continue
+            self.windows.append(spectrogram_windows(spec, window_size, layout))
+            self.labels.append(window_labels(half_labels(spec.shape[1]), window_size).astype(np.float32))
+        if not self.windows:
+            raise ValueError(f"No spectrogram is longer than the {window_size}-column window")
+
+        self.window_shape = self.windows[0].shape[1:]
+        self.offsets = np.concatenate([[0], np.cumsum([len(w) for w in self.windows])])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def gather(self, indices):
+        # Copies only the requested windows, in the requested order
+        indices = np.asarray(indices)
+        X = np.empty((len(indices),) + self.window_shape, dtype=np.float32)
+        y = np.empty(len(indices), dtype=np.float32)
+        sources = np.searchsorted(self.offsets, indices, side='right') - 1
+        for source in np.unique(sources):
+            mask = sources == source
+            local = indices[mask] - self.offsets[source]
+            X[mask] = self.windows[source][local]
+            y[mask] = self.labels[source][local]
+        return X, y
+
+
+def make_dataset(source, indices, batch_size=32, shuffle=False, cache=None, seed=42):
+    # cache: None (off), '' (in memory) or a file path prefix
+    ds = tf.data.Dataset.from_tensor_slices(np.asarray(indices, dtype=np.int64))
+    if shuffle and cache is None:
+        ds = ds.shuffle(len(indices), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+
+    def load(batch_indices):
+        X, y = tf.numpy_function(source.gather, [batch_indices], [tf.float32, tf.float32])
+        X.set_shape((None,) + tuple(source.window_shape))
+        y.set_shape((None,))
+        return X, y
+
+    ds = ds.map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+    if cache is not None:
+        # Batches are cached once; shuffle their order every epoch instead
+        ds = ds.cache(cache)
+        if shuffle:
+            ds = ds.shuffle(256, seed=seed, reshuffle_each_iteration=True)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def add_dataset_args(parser):
+    group = parser.add_argument_group('input pipeline')
+    group.add_argument('--spectrograms', nargs='+', default=[DEFAULT_SPECTROGRAM],
+                       help='Spectrogram .npy files to train on')
+    group.add_argument('--tf-data', action='store_true',
+                       help='Stream windows from memory-mapped spectrograms with tf.data')
+    group.add_argument('--batch-size', type=int, default=32)
+    group.add_argument('--cache', nargs='?', const='', default=None,
+                       help='Cache gathered batches (in memory, or under the given file prefix)')
+    group.add_argument('--store', help='Read from a spectrogram store instead of --spectrograms')
+    group.add_argument('--stations', nargs='+', help='Store stations to use (default: all)')
+    group.add_argument('--start', help='Start of the store time range (epoch seconds or ISO-8601)')
+    group.add_argument('--end', help='End of the store time range (epoch seconds or ISO-8601)')
+    return group
+
+
+def dataset_sources(args):
+    # Spectrogram paths, or memory-mapped store pieces for the selected range
+    if not args.store:
+        return args.spectrograms
+    store = SpectrogramStore(args.store)
+    sources = []
+    for station in args.stations or store.stations():
+        sources.extend(spec for _, spec in store.ranges(station, args.start, args.end))
+    return sources
+
+
+def load_training_data(args, layout, window_size=WINDOW_SIZE):
+    # Returns (train, val, input_shape); train/val are tf.data datasets with
+    # --tf-data, (X, y) arrays otherwise
+    source = WindowSource(dataset_sources(args), layout, window_size)
+    train_idx, test_idx = split_indices(len(source))
+
+    if not args.tf_data:
+        return source.gather(train_idx), source.gather(test_idx), source.window_shape
+
+    def cache_path(split):
+        return args.cache + split if args.cache else args.cache
+
+    train = make_dataset(source, train_idx, args.batch_size, shuffle=True, cache=cache_path('_train'))
+    val = make_dataset(source, test_idx, args.batch_size, cache=cache_path('_val'))
+    return train, val, source.window_shape
+
+
+def fit(model, train, val, args, epochs):
+    if args.tf_data:
+        return model.fit(train, epochs=epochs, validation_data=val)
+    X_train, y_train = train
+    return model.fit(X_train, y_train, epochs=epochs, batch_size=args.batch_size, validation_data=val)
@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from payload import max_body_bytes
+
+# Production entry point for deploy_both.py:
+#   - N worker processes, each importing deploy_both (so each loads the models
+#     once) and serving it on a loopback port with a fixed-size thread pool
+#   - an asyncio front end on the public port that reads each request fully
+#     before handing it to a worker, so slow clients never hold an inference
+#     thread, and relays the worker's response back
+#
+# Usage (from the repo root): python scripts/serve.py [--config config/serving.json]
+
+DEFAULT_CONFIG = {
+    "host": "0.0.0.0",
+    "port": 5000,
+    "workers": 4,
+    "threads_per_worker": 8,
+    "worker_base_port": 5101,
+    "tf_intra_op_threads": 0,  # 0: share the cores evenly between workers
+    "client_timeout_s": 30,
+    "bulk_max_windows": 100000,
+    "max_body_bytes": None,  # None: sized for bulk_max_windows (payload.max_body_bytes)
+    "batch_max_size": 32,
+    "batch_max_wait_ms": 5,
+    "prediction_cache_size": 65536,
+    "prediction_cache_path": None,  # e.g. "/dev/shm/hazard_cache.sqlite" to share results between workers
+    "backend": "keras",  # or "tflite": serve the export_tflite.py artifacts
+    "tflite_quantization": "float16",
+    "fast_start": False,  # bind workers before their models are loaded (see /ready)
+    "model_dir": "models",  # watched for new model versions and routing.json
+    "model_poll_s": 5,
+}
+
+
+def load_config(path):
+    config = dict(DEFAULT_CONFIG)
+    if path and os.path.exists(path):
+        with open(path) as f:
+            config.update(json.load(f))
+    # The front end and the workers enforce the same limit
+    config["max_body_bytes"] = config["max_body_bytes"] or max_body_bytes(config["bulk_max_windows"])
+    return config
+
+
+# --- Worker processes -------------------------------------------------------
+
+def run_worker(index, port, config):
+    # TensorFlow reads these when it initialises, i.e. on the import below
+    intra_op = config["tf_intra_op_threads"] or max(1, (os.cpu_count() or 1) // config["workers"])
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(intra_op)
+    os.environ["BATCH_MAX_SIZE"] = str(config["batch_max_size"])
+    os.environ["BATCH_MAX_WAIT_MS"] = str(config["batch_max_wait_ms"])
+    os.environ["FAST_START"] = "1" if config["fast_start"] else "0"
+    os.environ["HAZARD_BACKEND"] = config["backend"]
+    os.environ["TFLITE_QUANTIZATION"] = config["tflite_quantization"]
+    os.environ["PREDICTION_CACHE_SIZE"] = str(config["prediction_cache_size"])
+    os.environ["PREDICTION_CACHE_PATH"] = config["prediction_cache_path"] or ""
+    os.environ["MODEL_DIR"] = config["model_dir"]
+    os.environ["MODEL_POLL_S"] = str(config["model_poll_s"])
+    os.environ["BULK_MAX_WINDOWS"] = str(config["bulk_max_windows"])
+    os.environ["MAX_BODY_BYTES"] = str(config["max_body_bytes"])
+    os.environ["WORKER_INDEX"] = str(index)  # prefix of stream ids opened here
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor handles shutdown
+
+    from werkzeug.serving import BaseWSGIServer
+    from deploy_both import app
+
+    class PooledWSGIServer(BaseWSGIServer):
+        # Serves each connection on a bounded thread pool instead of one
+        # thread per connection
+        multithread = True
+
+        def __init__(self, host, port, app, threads):
+            super().__init__(host, port, app)
+            self.pool = ThreadPoolExecutor(threads, thread_name_prefix=f"worker-{port}")
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._process, request, client_address)
+
+        def _process(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledWSGIServer("127.0.0.1", port, app, config["threads_per_worker"])
+    print(f"Worker {os.getpid()} serving on 127.0.0.1:{port}")
+    server.serve_forever()
+
+
+def start_worker(index, port, config):
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_worker, args=(index, port, config), name=f"hazard-worker-{port}", daemon=True)
+    process.start()
+    return process
+
+
+def wait_for_port(port, process, timeout=300):
+    # Workers bind once their models are loaded and warm, or straight away
+    # with fast_start
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not process.is_alive():
+            raise RuntimeError(f"Worker on port {port} exited with code {process.exitcode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"Worker on port {port} did not start within {timeout}s")
+
+
+# --- Front end --------------------------------------------------------------
+
+def http_response(status, content_type, body):
+    head = (f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+    return head.encode() + body
+
+
+def simple_response(status, message):
+    return http_response(status, "application/json", json.dumps({"error": message}).encode())
+
+
+def rewrite_head(head, client_host):
+    # One request per connection on both sides: the worker's response is
+    # relayed until it closes (streamed NDJSON responses have no length),
+    # and the front end then closes the client connection too. Clients do
+    # not get keep-alive. The body has already been read, so Expect is
+    # answered here and not passed on.
+    lines = head.decode("latin-1").split("\r\n")
+    headers = [line for line in lines[1:]
+               if line and not line.lower().startswith(("connection:", "keep-alive:", "expect:"))]
+    headers += ["Connection: close", f"X-Forwarded-For: {client_host}"]
+    return ("\r\n".join([lines[0]] + headers) + "\r\n\r\n").encode("latin-1")
+
+
+STREAM_PATH = re.compile(r"^[A-Z]+ /stream/[^/\s]+/(\d+)-")
+
+
+def sticky_worker(head):
+    # Index of the worker holding a stream's state, from the stream id prefix
+    match = STREAM_PATH.match(head.decode("latin-1"))
+    return int(match.group(1)) if match else None
+
+
+# Per-process state: the front end asks every worker and combines the
+# answers instead of forwarding the request to whichever worker is free
+FAN_OUT_PATHS = ("/metrics", "/cache/stats", "/models")
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def fan_out_path(head):
+    method, _, rest = head.decode("latin-1").partition(" ")
+    path = rest.split(" ", 1)[0].split("?", 1)[0]
+    return path if method == "GET" and path in FAN_OUT_PATHS else None
+
+
+def merge_metrics(texts):
+    # Prometheus text of each worker with a worker="<index>" label on every
+    # sample; each metric's HELP/TYPE once, with all its samples below it
+    families = {}
+    for index, text in texts:
+        name = None
+        for line in text.splitlines():
+            if line.startswith("# "):
+                name = line.split(" ", 3)[2]
+                header = families.setdefault(name, ([], []))[0]
+                if line not in header:
+                    header.append(line)
+            elif line:
+                series, _, value = line.rpartition(" ")
+                label = f'worker="{index}"'
+                series = series[:-1] + f",{label}}}" if series.endswith("}") else series + f"{{{label}}}"
+                families.setdefault(name, ([], []))[1].append(f"{series} {value}")
+    return "\n".join(line for header, samples in families.values() for line in header + samples) + "\n"
+
+
+def content_length(head):
+    length = 0
+    for line in head.decode("latin-1").split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        name = name.strip().lower()
+        if name == "transfer-encoding" and value.strip().lower() != "identity":
+            return None
+        if name == "content-length":
+            length = int(value.strip())
+    return length
+
+
+def expects_continue(head):
+    # curl and others send "Expect: 100-continue" for bodies over 1 KB and
+    # wait (about 1 s) for the interim response before sending the body
+    for line in head.decode("latin-1").split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "expect" and value.strip().lower() == "100-continue":
+            return True
+    return False
+
+
+class FrontEnd:
+    def __init__(self, config, ports):
+        self.config = config
+        self.ports = ports
+        # One token per worker thread: a request is only forwarded when a
+        # worker thread is free, so queued requests wait here, not in a worker
+        self.slots = asyncio.Queue()
+        for _ in range(config["threads_per_worker"]):
+            for port in ports:
+                self.slots.put_nowait(port)
+
+    async def read_request(self, reader, writer):
+        timeout = self.config["client_timeout_s"]
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        length = content_length(head)
+        if length is None:
+            return head, None, simple_response("411 Length Required", "Chunked request bodies are not supported")
+        if length > self.config["max_body_bytes"]:
+            return head, None, simple_response("413 Payload Too Large", "Request body too large")
+        if length and expects_continue(head):
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+        body = await asyncio.wait_for(reader.readexactly(length), timeout) if length else b""
+        return head, body, None
+
+    async def handle(self, reader, writer):
+        client_host = (writer.get_extra_info("peername") or ("unknown",))[0]
+        try:
+            head, body, error = await self.read_request(reader, writer)
+            if error is not None:
+                writer.write(error)
+                return
+
+            path = fan_out_path(head)
+            if path is not None:
+                writer.write(await self.fan_out(path))
+                return
+
+            request_bytes = rewrite_head(head, client_host) + body
+            worker = sticky_worker(head)
+            if worker is not None and worker < len(self.ports):
+                # Stream pushes must reach the worker that owns the stream
+                await self.forward(self.ports[worker], request_bytes, writer)
+                return
+
+            port = await self.slots.get()
+            try:
+                await self.forward(port, request_bytes, writer)
+            finally:
+                self.slots.put_nowait(port)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            writer.write(simple_response("400 Bad Request", "Malformed or incomplete request"))
+        except ConnectionError:
+            pass
+        finally:
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+
+    async def fetch(self, port, path):
+        # Body of a worker's 200 response to GET path
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), self.config["client_timeout_s"])
+        finally:
+            writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        status = head.split(b" ", 2)[1:2]
+        if status != [b"200"]:
+            raise ConnectionError(f"HTTP {b' '.join(status).decode() or 'error'}")
+        return body
+
+    async def fan_out(self, path):
+        # /metrics: one exposition with a worker label per sample;
+        # /cache/stats and /models: {"workers": {"<index>": answer}}
+        answers = await asyncio.gather(*(self.fetch(port, path) for port in self.ports), return_exceptions=True)
+        if path == "/metrics":
+            texts = [(index, answer.decode()) for index, answer in enumerate(answers)
+                     if not isinstance(answer, Exception)]
+            return http_response("200 OK", METRICS_CONTENT_TYPE, merge_metrics(texts).encode())
+        workers = {str(index): {"error": str(answer) or type(answer).__name__} if isinstance(answer, Exception)
+                   else json.loads(answer) for index, answer in enumerate(answers)}
+        return http_response("200 OK", "application/json", json.dumps({"workers": workers}).encode())
+
+    async def forward(self, port, request_bytes, writer):
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            writer.write(simple_response("503 Service Unavailable", "Worker unavailable"))
+            return
+        try:
+            backend_writer.write(request_bytes)
+            await backend_writer.drain()
+            # Stream the response through as it arrives (NDJSON responses
+            # are never held in full here)
+            while True:
+                chunk = await backend_reader.read(65536)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+        finally:
+            backend_writer.close()
+
+
+async def supervise(workers, config):
+    # Restart workers that die; the front end keeps routing to their port
+    while True:
+        await asyncio.sleep(1)
+        for port, process in list(workers.items()):
+            if not process.is_alive():
+                print(f"Worker on port {port} exited with code {process.exitcode}, restarting")
+                workers[port] = start_worker(port - config["worker_base_port"], port, config)
+
+
+async def main(config):
+    ports = [config["worker_base_port"] + i for i in range(config["workers"])]
+    workers = {port: start_worker(index, port, config) for index, port in enumerate(ports)}
+    try:
+        for port, process in workers.items():
+            await asyncio.get_running_loop().run_in_executor(None, wait_for_port, port, process)
+
+        front_end = FrontEnd(config, ports)
+        server = await asyncio.start_server(front_end.handle, config["host"], config["port"])
+        print(f"Serving on {config['host']}:{config['port']} with {config['workers']} workers "
+              f"x {config['threads_per_worker']} threads")
+        async with server:
+            await asyncio.gather(server.serve_forever(), supervise(workers, config))
+    finally:
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            process.join(timeout=10)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Multi-worker server for the hazard prediction API')
+    parser.add_argument('--config', default='config/serving.json')
+    parser.add_argument('--workers', type=int, help='Overrides "workers" in the config')
+    parser.add_argument('--threads-per-worker', type=int, help='Overrides "threads_per_worker" in the config')
+    parser.add_argument('--port', type=int, help='Overrides "port" in the config')
+    parser.add_argument('--prediction-cache-size', type=int, help='Overrides "prediction_cache_size" in the config')
+    parser.add_argument('--fast-start', action='store_true', default=None, help='Sets "fast_start" in the config')
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    for key in ("workers", "threads_per_worker", "port", "prediction_cache_size", "fast_start"):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    try:
+        asyncio.run(main(config))
+    except KeyboardInterrupt:
+        pass
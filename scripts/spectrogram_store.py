@@ -0,0 +1,186 @@
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+# On-disk spectrogram store indexed by station and time:
+#
+#   <root>/index.json                    chunk index (station, start, dt, columns, file)
+#   <root>/<station>/<start>_<n>.npy     (freq, n) float32 log-spectrogram chunk
+#
+# Chunks are plain .npy files, so any time range is read through
+# np.load(mmap_mode='r') and only the pages covering it are touched. Appending
+# writes new chunk files and rewrites the small index atomically; readers call
+# refresh() to pick up chunks appended by another process. There is a single
+# writer per store (extract_spectrogram.py / the batch extractor).
+
+DEFAULT_STORE = 'data/seismic/store'
+CHUNK_COLUMNS = 65536
+
+
+def parse_time(value):
+    # Epoch seconds or an ISO-8601 timestamp (UTC unless an offset is given)
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+class SpectrogramStore:
+    def __init__(self, root=DEFAULT_STORE):
+        self.root = root
+        self.index_path = os.path.join(root, 'index.json')
+        self.refresh()
+
+    def refresh(self):
+        self.chunks = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.chunks = json.load(f)['chunks']
+
+    def stations(self):
+        return sorted({chunk['station'] for chunk in self.chunks})
+
+    def append(self, station, start_time, spec, dt, chunk_columns=CHUNK_COLUMNS):
+        # spec: (freq, time) spectrogram whose first column is at start_time
+        # (epoch seconds) and whose columns are dt seconds apart
+        # Re-appending a range (e.g. extracting the same trace again) replaces
+        # the chunks of the station that start inside it instead of adding
+        # duplicates next to them
+        station_dir = os.path.join(self.root, station)
+        os.makedirs(station_dir, exist_ok=True)
+        end_time = float(start_time) + spec.shape[1] * dt
+        kept, replaced = [], []
+        for chunk in self.chunks:
+            covered = chunk['station'] == station and float(start_time) <= chunk['start'] < end_time
+            (replaced if covered else kept).append(chunk)
+        self.chunks = kept
+        written = set()
+
+        for offset in range(0, spec.shape[1], chunk_columns):
+            part = np.ascontiguousarray(spec[:, offset:offset + chunk_columns], dtype=np.float32)
+            start = float(start_time) + offset * dt
+            name = f"{start:.6f}_{part.shape[1]}.npy"
+            tmp_path = os.path.join(station_dir, name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, part)
+            os.replace(tmp_path, os.path.join(station_dir, name))
+            self.chunks.append({'station': station, 'start': start, 'dt': float(dt),
+                                'columns': int(part.shape[1]), 'freqs': int(part.shape[0]),
+                                'file': os.path.join(station, name)})
+            written.add(os.path.join(station, name))
+        self._write_index()
+
+        # Chunk files of the replaced entries that were not overwritten
+        for chunk in replaced:
+            if chunk['file'] not in written:
+                try:
+                    os.remove(os.path.join(self.root, chunk['file']))
+                except FileNotFoundError:
+                    pass
+
+    def _write_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.chunks.sort(key=lambda chunk: (chunk['station'], chunk['start']))
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'chunks': self.chunks}, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def find(self, station, start=None, end=None):
+        # Index entries of a station overlapping [start, end)
+        start, end = parse_time(start), parse_time(end)
+        found = []
+        for chunk in self.chunks:
+            if chunk['station'] != station:
+                continue
+            chunk_end = chunk['start'] + chunk['columns'] * chunk['dt']
+            if (start is None or chunk_end > start) and (end is None or chunk['start'] < end):
+                found.append(chunk)
+        return found
+
+    def ranges(self, station, start=None, end=None):
+        # (start_time, (freq, n) spectrogram) ranges covering [start, end),
+        # one per stretch of back-to-back chunks. A range within one chunk is
+        # its memory-mapped view; one spanning several is a ChunkedSpectrogram
+        # over their views. Windows are built within a range, so they cross
+        # chunk boundaries but none spans a gap in the recording.
+        return [(range_start, spec) for _, range_start, spec in self.pieces(station, start, end)]
+
+    def pieces(self, station, start=None, end=None):
+        # Like ranges(), with the column spacing (dt) of each range first
+        start, end = parse_time(start), parse_time(end)
+        runs = []
+        for chunk in self.find(station, start, end):
+            first, last = 0, chunk['columns']
+            if start is not None:
+                first = max(0, int(np.ceil((start - chunk['start']) / chunk['dt'])))
+            if end is not None:
+                last = min(last, int(np.ceil((end - chunk['start']) / chunk['dt'])))
+            if last <= first:
+                continue
+            spec = np.load(os.path.join(self.root, chunk['file']), mmap_mode='r')[:, first:last]
+            piece_start = chunk['start'] + first * chunk['dt']
+            if runs and self._continues(runs[-1], chunk, piece_start, spec):
+                runs[-1][2].append(spec)
+            else:
+                runs.append((chunk['dt'], piece_start, [spec]))
+        return [(dt, run_start, parts[0] if len(parts) == 1 else ChunkedSpectrogram(parts))
+                for dt, run_start, parts in runs]
+
+    @staticmethod
+    def _continues(run, chunk, piece_start, spec):
+        # The piece starts one column after the run ends, at the same spacing
+        # and frequency resolution
+        dt, run_start, parts = run
+        run_end = run_start + sum(part.shape[1] for part in parts) * dt
+        return (chunk['dt'] == dt and spec.shape[0] == parts[0].shape[0]
+                and abs(piece_start - run_end) < dt / 2)
+
+    def read(self, station, start=None, end=None):
+        # One (freq, n) array for [start, end); copies only that range
+        pieces = self.ranges(station, start, end)
+        if not pieces:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate([np.asarray(spec) for _, spec in pieces], axis=1)
+
+
+class ChunkedSpectrogram:
+    # (freq, n) spectrogram over back-to-back chunk views. Nothing is copied
+    # up front: columns(first, last) returns a view when the columns fall in
+    # one chunk and concatenates only those columns when they span a boundary.
+    def __init__(self, parts):
+        self.parts = parts
+        self.offsets = np.cumsum([0] + [part.shape[1] for part in parts])
+        self.shape = (parts[0].shape[0], int(self.offsets[-1]))
+        self.dtype = parts[0].dtype
+
+    def columns(self, first, last):
+        selected = []
+        for part, offset in zip(self.parts, self.offsets[:-1]):
+            a, b = max(first - offset, 0), min(last - offset, part.shape[1])
+            if b > a:
+                selected.append(part[:, a:b])
+        if len(selected) == 1:
+            return selected[0]
+        if not selected:
+            return np.empty((self.shape[0], 0), dtype=self.dtype)
+        return np.concatenate(selected, axis=1)
+
+    def __getitem__(self, key):
+        # spec[rows, first:last] with a unit-step column slice
+        rows, cols = key if isinstance(key, tuple) else (key, slice(None))
+        first, last, step = cols.indices(self.shape[1])
+        if step != 1:
+            raise IndexError('ChunkedSpectrogram columns must be a unit-step slice')
+        return self.columns(first, last)[rows]
+
+    def __array__(self, dtype=None, copy=None):
+        spec = self.columns(0, self.shape[1])
+        return spec if dtype is None else spec.astype(dtype)
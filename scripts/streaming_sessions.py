@@ -0,0 +1,123 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import tensorflow as tf
+
+# Stateful streaming inference for the seismic GRU.
+#
+# A client opens a stream and then pushes only the new spectrogram columns.
+# The server keeps the GRU hidden states of the stream and advances them by
+# the new timesteps, instead of re-running all 64 steps of an overlapping
+# window on every call.
+#
+# Note the state is carried over the whole stream rather than restarting
+# from zero every 64 columns, so the score is the GRU's view of the stream
+# so far; it tracks, but is not identical to, the sliding-window score.
+
+
+class RecurrentStepper:
+    # Wraps a Sequential model made of GRU layers followed by per-timestep or
+    # head layers (e.g. seismic_best_gru.h5: GRU, GRU, Dense, Dense). A GRU's
+    # output at a timestep is its hidden state, so the last output of each
+    # GRU layer is the state to carry to the next call.
+    def __init__(self, model):
+        self.layers = [layer for layer in model.layers if not isinstance(layer, tf.keras.layers.InputLayer)]
+        rnn_layers = [layer for layer in self.layers if isinstance(layer, tf.keras.layers.RNN)]
+        if not rnn_layers or not all(isinstance(layer, tf.keras.layers.GRU) for layer in rnn_layers):
+            raise ValueError("Streaming sessions need a model whose recurrent layers are all GRUs")
+
+        self.state_sizes = [layer.units for layer in rnn_layers]
+        self.n_features = model.input_shape[-1]
+        self._advance = tf.function(
+            self._advance_steps,
+            input_signature=[
+                tf.TensorSpec(shape=(None, self.n_features), dtype=tf.float32),
+                [tf.TensorSpec(shape=(1, units), dtype=tf.float32) for units in self.state_sizes],
+            ],
+        )
+        # Trace once before the first request
+        self.advance(np.zeros((1, self.n_features), dtype=np.float32), self.initial_states())
+
+    def initial_states(self):
+        return [np.zeros((1, units), dtype=np.float32) for units in self.state_sizes]
+
+    def _advance_steps(self, columns, states):
+        x = columns[tf.newaxis]
+        new_states = []
+        for layer in self.layers:
+            if isinstance(layer, tf.keras.layers.GRU):
+                x = layer(x, initial_state=[states[len(new_states)]], training=False)
+                new_states.append(x[:, -1] if layer.return_sequences else x)
+            else:
+                x = layer(x, training=False)
+        return x, new_states
+
+    def advance(self, columns, states):
+        # columns: (k, n_features) new timesteps; returns (probability, states)
+        output, new_states = self._advance(np.asarray(columns, dtype=np.float32), states)
+        return float(np.asarray(output).reshape(-1)[-1]), [state.numpy() for state in new_states]
+
+
+class _Session:
+    def __init__(self, states):
+        self.states = states
+        self.steps = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class SessionStore:
+    # Per-stream recurrent state, bounded by an LRU size limit and an idle TTL
+    def __init__(self, stepper, max_sessions=1024, ttl_s=600, id_prefix=None):
+        self.stepper = stepper
+        # serve.py workers prefix ids with their index so the front end can
+        # route a stream's pushes back to the process holding its state
+        self.id_prefix = id_prefix
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self):
+        stream_id = uuid.uuid4().hex
+        if self.id_prefix:
+            stream_id = f"{self.id_prefix}-{stream_id}"
+        with self._lock:
+            self._evict()
+            self._sessions[stream_id] = _Session(self.stepper.initial_states())
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return stream_id
+
+    def push(self, stream_id, columns):
+        # Raises KeyError for unknown or expired streams
+        with self._lock:
+            self._evict()
+            session = self._sessions[stream_id]
+            self._sessions.move_to_end(stream_id)
+            session.last_used = time.monotonic()
+
+        # Pushes to one stream are applied in order; other streams run freely
+        with session.lock:
+            probability, session.states = self.stepper.advance(columns, session.states)
+            session.steps += len(columns)
+            return probability, session.steps
+
+    def close(self, stream_id):
+        with self._lock:
+            return self._sessions.pop(stream_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self):
+        # Sessions are kept in last-used order, so expired ones are at the front
+        deadline = time.monotonic() - self.ttl_s
+        while self._sessions:
+            stream_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= deadline:
+                break
+            del self._sessions[stream_id]
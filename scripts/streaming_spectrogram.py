@@ -0,0 +1,113 @@
+import argparse
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import spectrogram
+
+# Same parameters as extract_spectrogram.py
+SEGMENT_LENGTH = 256
+OVERLAP = 128
+WINDOW_SIZE = 64
+LOG_EPSILON = 1e-10
+
+
+class StreamingSpectrogram:
+    # Turns a continuous waveform, fed in arbitrary chunks, into log-spectrogram
+    # columns and ready-to-score (window_size, freq) windows.
+    #
+    # Only the samples that do not yet fill a segment (plus the segment
+    # overlap) and the last window_size - 1 columns are kept between calls,
+    # so memory and per-chunk work stay bounded on continuous data. Each
+    # segment is computed exactly once, with the same scipy settings as the
+    # offline extract_spectrogram.py.
+    #
+    # The offline script normalises by the global max |amplitude|. Here the
+    # running peak is used instead; because the PSD is quadratic in the
+    # amplitude, this is a division of each column by peak ** 2. peak_decay < 1
+    # lets the peak fall back after a large event instead of damping the rest
+    # of the stream forever.
+    def __init__(self, nperseg=SEGMENT_LENGTH, noverlap=OVERLAP, window_size=WINDOW_SIZE,
+                 hop=1, fs=1.0, peak_decay=1.0):
+        self.nperseg = nperseg
+        self.noverlap = noverlap
+        self.step = nperseg - noverlap
+        self.window_size = window_size
+        self.hop = hop
+        self.fs = fs
+        self.peak_decay = peak_decay
+        self.n_freqs = nperseg // 2 + 1
+
+        self.peak = 0.0
+        self._samples = np.empty(0, dtype=np.float64)
+        self._history = np.empty((0, self.n_freqs), dtype=np.float32)
+        self.columns_seen = 0
+
+    def push(self, chunk):
+        # Returns the windows completed by this chunk, shape
+        # (n, window_size, n_freqs) -- the /predict/earthquake layout
+        return self.windows(self.columns(chunk))
+
+    def columns(self, chunk):
+        # Returns the new log-spectrogram columns, shape (k, n_freqs)
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.size:
+            self.peak = max(self.peak * self.peak_decay, float(np.max(np.abs(chunk))))
+        self._samples = np.concatenate([self._samples, chunk])
+
+        n_segments = (len(self._samples) - self.noverlap) // self.step
+        if n_segments <= 0:
+            return np.empty((0, self.n_freqs), dtype=np.float32)
+
+        used = self.noverlap + n_segments * self.step
+        _, _, Sxx = spectrogram(self._samples[:used], fs=self.fs,
+                                nperseg=self.nperseg, noverlap=self.noverlap)
+        # Keep the overlap (and any partial segment) for the next call
+        self._samples = self._samples[n_segments * self.step:].copy()
+
+        scale = self.peak ** 2 if self.peak > 0 else 1.0
+        return np.log(Sxx / scale + LOG_EPSILON).T.astype(np.float32)
+
+    def windows(self, columns):
+        if len(columns) == 0:
+            return np.empty((0, self.window_size, self.n_freqs), dtype=np.float32)
+
+        history = np.concatenate([self._history, columns])
+        first_column = self.columns_seen - len(self._history)
+        self.columns_seen += len(columns)
+        self._history = history[-(self.window_size - 1):].copy() if self.window_size > 1 else history[:0]
+
+        if len(history) < self.window_size:
+            return np.empty((0, self.window_size, self.n_freqs), dtype=np.float32)
+
+        # (n, n_freqs, window_size) strided view -> (n, window_size, n_freqs)
+        windows = sliding_window_view(history, self.window_size, axis=0).transpose(0, 2, 1)
+
+        # Only windows ending on one of the new columns, every hop columns
+        ends = first_column + np.arange(self.window_size - 1, len(history))
+        new = (ends >= self.columns_seen - len(columns)) & ((ends - (self.window_size - 1)) % self.hop == 0)
+        return windows[new]
+
+
+if __name__ == '__main__':
+    from obspy import read
+
+    parser = argparse.ArgumentParser(description='Replay a waveform file through the streaming spectrogram stage')
+    parser.add_argument('waveform', nargs='?', default='data/seismic/12.037')
+    parser.add_argument('--chunk-size', type=int, default=4096, help='Samples per pushed chunk')
+    parser.add_argument('--hop', type=int, default=1, help='Emit a window every HOP columns')
+    args = parser.parse_args()
+
+    data = read(args.waveform)[0].data
+    stream = StreamingSpectrogram(hop=args.hop)
+
+    n_windows, latencies = 0, []
+    for start in range(0, len(data), args.chunk_size):
+        t0 = time.perf_counter()
+        n_windows += len(stream.push(data[start:start + args.chunk_size]))
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    print('Chunks:', len(latencies))
+    print('Columns:', stream.columns_seen)
+    print('Windows:', n_windows)
+    print('Per-chunk latency: mean {:.3f} ms, max {:.3f} ms'.format(np.mean(latencies), np.max(latencies)))
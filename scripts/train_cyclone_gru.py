@@ -1,39 +1,34 @@
-import numpy as np
 import tensorflow as tf
-from sklearn.model_selection import train_test_split
 import matplotlib.pyplot as plt
 
-# Load or simulate cyclone multivariate time series data
-# Replace with actual data loading logic
-time_slices = 1000
-window_size = 64
-num_features = 6  # e.g., lat, lon, pressure, wind speed, storm age, distance to land
+from cyclone_features import FEATURES, load_windows, storm_split
+from windowing import WINDOW_SIZE, take
 
-data = np.random.rand(time_slices, num_features)  # Replace with actual cyclone feature matrix
+# Load cyclone feature windows built by cyclone_features.py:
+# lat, lon, pressure, wind speed, storm age, distance to land
+window_size = WINDOW_SIZE
+num_features = len(FEATURES)
 
-# Example binary labels for classification (modify as needed)
-labels = np.zeros(time_slices)
-labels[:time_slices // 2] = 1
+X_samples, windows = load_windows()
 
-# Prepare time windows
-X_samples, y_samples = [], []
-for start in range(time_slices - window_size):
-    segment = data[start:start + window_size, :]
-    label = labels[start + window_size // 2]
-    X_samples.append(segment)
-    y_samples.append(label)
+# Label: storm reaches hurricane strength within 24 h after the window
+y_samples = windows['label']
 
-X_samples = np.array(X_samples)
-y_samples = np.array(y_samples)
+# Split into training/testing sets by storm
+train_idx, test_idx = storm_split(windows)
+X_train, X_test = take(X_samples, windows['start'][train_idx]), take(X_samples, windows['start'][test_idx])
+y_train, y_test = y_samples[train_idx], y_samples[test_idx]
 
-# Split into training/testing sets
-X_train, X_test, y_train, y_test = train_test_split(
-    X_samples, y_samples, test_size=0.2, random_state=42
-)
+# Features are on very different scales (degrees, hPa, km); the model
+# normalises its raw inputs itself so /predict/cyclone takes raw features
+normalizer = tf.keras.layers.Normalization(axis=-1)
+normalizer.adapt(X_train.reshape(-1, num_features))
 
 # Build GRU model
 model = tf.keras.Sequential([
-    tf.keras.layers.GRU(64, input_shape=(window_size, num_features), return_sequences=True),
+    tf.keras.Input(shape=(window_size, num_features)),
+    normalizer,
+    tf.keras.layers.GRU(64, return_sequences=True),
     tf.keras.layers.GRU(32),
     tf.keras.layers.Dense(32, activation='relu'),
     tf.keras.layers.Dense(1, activation='sigmoid'),
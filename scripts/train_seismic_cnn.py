@@ -1,44 +1,21 @@
-import numpy as np
+import argparse
+
 import tensorflow as tf
 import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split
-
-# Load spectrogram
-spec = np.load('data/seismic/spectrogram.npy')
-
-print('Spectrogram shape:', spec.shape)  # (frequencies, time_slices)
-
-window_size = 64
-time_slices = spec.shape[1]
-
-X_samples = []
-y_samples = []
-
-# Labels example: first half earthquake (1), second half no event (0)
-labels = np.zeros(time_slices)
-labels[:time_slices // 2] = 1
-
-# Generate samples using sliding window approach with valid shape check
-for start in range(0, time_slices - window_size):
-    sample = spec[:, start:start + window_size]
-    if sample.shape == (spec.shape[0], window_size):
-        X_samples.append(sample)
-        y_samples.append(labels[start + window_size // 2])
-
-X_samples = np.array(X_samples)
-y_samples = np.array(y_samples)
 
-print('Number of samples:', len(X_samples))
+from seismic_dataset import add_dataset_args, load_training_data, fit
 
-# Add channel dimension for CNN
-X_samples = X_samples[..., np.newaxis]
+parser = argparse.ArgumentParser(description='Train the seismic CNN classifier')
+add_dataset_args(parser)
+args = parser.parse_args()
 
-# Train-test split
-X_train, X_test, y_train, y_test = train_test_split(X_samples, y_samples, test_size=0.2, random_state=42)
+# Windows in CNN layout (freq, window, 1), taken from memory-mapped spectrograms
+# (labels example: first half earthquake (1), second half no event (0))
+train_data, val_data, input_shape = load_training_data(args, layout='cnn')
 
 # Build CNN model
 model = tf.keras.Sequential([
-    tf.keras.layers.Conv2D(32, kernel_size=(3, 3), activation='relu', input_shape=X_train.shape[1:]),
+    tf.keras.layers.Conv2D(32, kernel_size=(3, 3), activation='relu', input_shape=input_shape),
     tf.keras.layers.MaxPooling2D((2, 2)),
     tf.keras.layers.Conv2D(64, (3, 3), activation='relu'),
     tf.keras.layers.MaxPooling2D((2, 2)),
@@ -50,7 +27,7 @@ model = tf.keras.Sequential([
 model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
 
 # Train model
-history = model.fit(X_train, y_train, epochs=20, batch_size=32, validation_data=(X_test, y_test))
+history = fit(model, train_data, val_data, args, epochs=20)
 
 # Plot training history
 plt.plot(history.history['accuracy'], label='training accuracy')
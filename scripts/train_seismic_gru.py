@@ -1,32 +1,21 @@
-import numpy as np
+import argparse
+
 import tensorflow as tf
-from sklearn.model_selection import train_test_split
 import matplotlib.pyplot as plt
 
-# Load spectrogram
-spec = np.load('data/seismic/spectrogram.npy')
-window_size = 64
-time_slices = spec.shape[1]
-
-labels = np.zeros(time_slices)
-labels[:time_slices // 2] = 1
-
-X_samples, y_samples = [], []
-for start in range(0, time_slices - window_size):
-    sample = spec[:, start:start + window_size].T
-    if sample.shape == (window_size, spec.shape[0]):
-        X_samples.append(sample)
-        y_samples.append(labels[start + window_size // 2])
+from seismic_dataset import add_dataset_args, load_training_data, fit
 
-X_samples = np.array(X_samples)
-y_samples = np.array(y_samples)
+parser = argparse.ArgumentParser(description='Train the seismic GRU classifier')
+add_dataset_args(parser)
+args = parser.parse_args()
 
-# Train-test split
-X_train, X_test, y_train, y_test = train_test_split(X_samples, y_samples, test_size=0.2, random_state=42)
+# Windows in RNN layout: (window_size, frequencies), taken from memory-mapped spectrograms
+# (labels example: first half earthquake (1), second half no event (0))
+train_data, val_data, input_shape = load_training_data(args, layout='rnn')
 
 # Build GRU model
 model = tf.keras.Sequential([
-    tf.keras.layers.GRU(64, input_shape=(window_size, spec.shape[0]), return_sequences=True),
+    tf.keras.layers.GRU(64, input_shape=input_shape, return_sequences=True),
     tf.keras.layers.GRU(32),
     tf.keras.layers.Dense(32, activation="relu"),
     tf.keras.layers.Dense(1, activation="sigmoid"),
@@ -35,7 +24,7 @@ model = tf.keras.Sequential([
 model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
 
 # Train
-history = model.fit(X_train, y_train, epochs=20, batch_size=32, validation_data=(X_test, y_test))
+history = fit(model, train_data, val_data, args, epochs=20)
 
 # Plot training
 plt.plot(history.history['accuracy'], label='training accuracy')
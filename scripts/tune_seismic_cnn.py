@@ -1,34 +1,63 @@
-import numpy as np
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
 import tensorflow as tf
 from tensorflow import keras
-from kerastuner.tuners import RandomSearch
-from sklearn.model_selection import train_test_split
+from kerastuner.tuners import Hyperband, RandomSearch
+
+from seismic_dataset import add_dataset_args, load_training_data
 
-# Load spectrogram data
-spec = np.load('data/seismic/spectrogram.npy')
-window_size = 64
-time_slices = spec.shape[1]
+# Hyperparameter search for the seismic CNN.
+#
+# Hyperband (the default) trains many configurations for a few epochs and
+# only continues the best third of each round, and every trial stops early
+# once val_accuracy stops improving.
+#
+# With --workers N the search runs as keras-tuner's distributed mode on this
+# machine: one chief process hosts the oracle and N worker processes each
+# run trials, with the cores split between them. Workers read the training
+# windows through tf.data from the same memory-mapped spectrograms, so the
+# page cache holds one copy of the data however many workers there are.
+#
+# Usage (from the repo root):
+#   python scripts/tune_seismic_cnn.py --workers 8
+#   python scripts/tune_seismic_cnn.py --tuner random --max-trials 10   # one process, as before
 
-labels = np.zeros(time_slices)
-labels[:time_slices // 2] = 1
+parser = argparse.ArgumentParser(description='Tune the seismic CNN hyperparameters')
+add_dataset_args(parser)
+tuning = parser.add_argument_group('tuning')
+tuning.add_argument('--tuner', choices=['hyperband', 'random'], default='hyperband')
+tuning.add_argument('--max-epochs', type=int, default=15)
+tuning.add_argument('--hyperband-factor', type=int, default=3)
+tuning.add_argument('--max-trials', type=int, default=10, help='Trials for --tuner random')
+tuning.add_argument('--patience', type=int, default=3, help='Early stopping patience in epochs')
+tuning.add_argument('--workers', type=int, default=0, help='Parallel trial processes (0: run in this process)')
+tuning.add_argument('--overwrite', action='store_true', help='Start a new search instead of resuming')
+tuning.add_argument('--role', choices=['chief', 'worker'], help=argparse.SUPPRESS)
+args = parser.parse_args()
 
-X_samples, y_samples = [], []
-for start in range(0, time_slices - window_size):
-    sample = spec[:, start:start + window_size]
-    if sample.shape == (spec.shape[0], window_size):
-        X_samples.append(sample)
-        y_samples.append(labels[start + window_size // 2])
-X_samples = np.array(X_samples)[..., np.newaxis]
-y_samples = np.array(y_samples)
+if args.role == 'worker':
+    # Each worker gets an equal share of the cores; must run before any op
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+if args.workers:
+    # Workers share the memory-mapped windows instead of materialising them
+    args.tf_data = True
 
-X_train, X_test, y_train, y_test = train_test_split(X_samples, y_samples, test_size=0.2, random_state=42)
+# Windows in CNN layout (freq, window, 1), taken from memory-mapped spectrograms
+train_data, val_data, input_shape = load_training_data(args, layout='cnn')
 
 def build_model(hp):
     model = keras.Sequential()
     model.add(keras.layers.Conv2D(filters=hp.Int('filters_1', 16, 64, step=16),
                                   kernel_size=hp.Choice('kernel_size_1', [3, 5]),
                                   activation='relu',
-                                  input_shape=X_train.shape[1:]))
+                                  input_shape=input_shape))
     model.add(keras.layers.MaxPooling2D(pool_size=(2, 2)))
     if hp.Boolean('second_conv'):
         model.add(keras.layers.Conv2D(filters=hp.Int('filters_2', 32, 128, step=32),
@@ -46,21 +75,102 @@ def build_model(hp):
                   metrics=['accuracy'])
     return model
 
-tuner = RandomSearch(
-    build_model,
-    objective='val_accuracy',
-    max_trials=10,
-    executions_per_trial=1,
-    directory='keras_tuner_dir',
-    project_name='seismic_cnn_tuning'
-)
+def make_tuner(overwrite):
+    common = dict(objective='val_accuracy', directory='keras_tuner_dir', overwrite=overwrite)
+    if args.tuner == 'hyperband':
+        return Hyperband(build_model, max_epochs=args.max_epochs, factor=args.hyperband_factor,
+                         project_name='seismic_cnn_hyperband', **common)
+    return RandomSearch(build_model, max_trials=args.max_trials, executions_per_trial=1,
+                        project_name='seismic_cnn_tuning', **common)
+
+def search(tuner):
+    callbacks = [keras.callbacks.EarlyStopping(monitor='val_accuracy', patience=args.patience)]
+    if args.tf_data:
+        tuner.search(train_data, epochs=args.max_epochs, validation_data=val_data, callbacks=callbacks)
+    else:
+        X_train, y_train = train_data
+        tuner.search(X_train, y_train, epochs=args.max_epochs, validation_data=val_data,
+                     batch_size=args.batch_size, callbacks=callbacks)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def stop(processes, grace=0, timeout=60):
+    # Gives the processes grace seconds to exit, then terminates the rest;
+    # returns the ones that had to be terminated
+    deadline = time.monotonic() + grace
+    while time.monotonic() < deadline and any(process.poll() is None for process in processes):
+        time.sleep(0.5)
+    stopped = [process for process in processes if process.poll() is None]
+    for process in stopped:
+        process.terminate()
+    for process in stopped:
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return stopped
+
+def wait_for_oracle(chief, port, timeout=300):
+    # The chief loads the data and builds the tuner before its oracle
+    # listens; wait until the port accepts connections or the chief exits
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if chief.poll() is not None:
+            sys.exit(f"Tuning chief exited with code {chief.returncode} before its oracle started")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.5)
+    stop([chief])
+    sys.exit(f"Tuning oracle did not listen on port {port} within {timeout}s")
+
+def run_distributed():
+    # Re-runs this script as the chief and the workers; keras-tuner picks
+    # the role up from the KERASTUNER_* variables
+    port = free_port()
+    command = [sys.executable, os.path.abspath(__file__)] + sys.argv[1:]
+    env = dict(os.environ, KERASTUNER_ORACLE_IP='127.0.0.1', KERASTUNER_ORACLE_PORT=str(port))
+
+    chief = subprocess.Popen(command + ['--role', 'chief'], env=dict(env, KERASTUNER_TUNER_ID='chief'))
+    wait_for_oracle(chief, port)
+    workers = [subprocess.Popen(command + ['--role', 'worker'], env=dict(env, KERASTUNER_TUNER_ID=f'tuner{i}'))
+               for i in range(args.workers)]
+
+    # Workers cannot finish without the oracle: if the chief fails, stop
+    # them rather than wait forever; if it finishes, they should follow
+    stopped = []
+    while any(worker.poll() is None for worker in workers):
+        if chief.poll() is not None:
+            if chief.returncode != 0:
+                stop(workers)
+                sys.exit(f"Tuning chief failed with code {chief.returncode}")
+            stopped = stop(workers, grace=60)
+            break
+        time.sleep(1)
+    failed = sum(worker.returncode != 0 for worker in workers if worker not in stopped)
+    stop([chief], grace=60)
+    if failed:
+        sys.exit(f"{failed} of {args.workers} tuning workers failed")
+
+if args.role is not None:
+    # Chief: serves the oracle until the search is done; worker: runs trials
+    search(make_tuner(args.overwrite and args.role == 'chief'))
+    sys.exit(0)
 
-tuner.search(X_train, y_train,
-             epochs=15,
-             validation_data=(X_test, y_test),
-             batch_size=32)
+if args.workers:
+    run_distributed()
+    tuner = make_tuner(overwrite=False)  # reload the finished search from disk
+else:
+    tuner = make_tuner(args.overwrite)
+    search(tuner)
 
 # Get the best model and save it
+tuner.results_summary(num_trials=3)
 best_model = tuner.get_best_models(num_models=1)[0]
 best_model.summary()
 best_model.save('models/seismic_best_cnn.h5')
@@ -0,0 +1,104 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Sliding windows shared by the training, tuning and evaluation scripts.
+#
+# Windows are strided views over the source array: nothing is copied until a
+# subset is gathered with take(). Like the original loops, windows start at
+# 0 .. time_slices - window_size - 1 and are labelled by their centre column.
+
+WINDOW_SIZE = 64
+
+
+def spectrogram_windows(spec, window_size=WINDOW_SIZE, layout='rnn'):
+    # spec: (freq, time_slices) spectrogram
+    #   layout='cnn' -> (n, freq, window_size, 1)
+    #   layout='rnn' -> (n, window_size, freq)
+    if layout not in ('cnn', 'rnn'):
+        raise ValueError(f"Unknown layout: {layout!r} (expected 'cnn' or 'rnn')")
+    if hasattr(spec, 'parts'):
+        return ChunkedWindows(spec, window_size, layout)
+    n = spec.shape[1] - window_size
+    windows = sliding_window_view(spec, window_size, axis=1)[:, :n]  # (freq, n, window_size)
+    if layout == 'cnn':
+        return windows.transpose(1, 0, 2)[..., np.newaxis]
+    return windows.transpose(1, 2, 0)
+
+
+class ChunkedWindows:
+    # spectrogram_windows() of a ChunkedSpectrogram (several back-to-back
+    # store chunks). Indexing with an int, slice or index array gathers those
+    # windows like the strided view would: windows inside one chunk come from
+    # that chunk's strided view, the window_size - 1 starting just before each
+    # boundary are assembled from the columns of both chunks.
+    def __init__(self, spec, window_size, layout):
+        self.spec = spec
+        self.window_size = window_size
+        self.layout = layout
+        n = max(spec.shape[1] - window_size, 0)
+        freq = spec.shape[0]
+        self.shape = (n, freq, window_size, 1) if layout == 'cnn' else (n, window_size, freq)
+        self._views = [sliding_window_view(part, window_size, axis=1) if part.shape[1] >= window_size else None
+                       for part in spec.parts]   # (freq, columns - window_size + 1, window_size)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        starts = np.arange(len(self))[key]
+        if starts.ndim == 0:
+            return self[starts[np.newaxis]][0]
+        offsets = self.spec.offsets
+        windows = np.empty((len(starts), self.spec.shape[0], self.window_size), dtype=self.spec.dtype)
+        chunk_of = np.searchsorted(offsets, starts, side='right') - 1
+        for chunk in np.unique(chunk_of):
+            rows = np.flatnonzero(chunk_of == chunk)
+            local = starts[rows] - offsets[chunk]
+            inside = local + self.window_size <= self.spec.parts[chunk].shape[1]
+            if inside.any():
+                windows[rows[inside]] = self._views[chunk][:, local[inside]].transpose(1, 0, 2)
+            for row in rows[~inside]:
+                windows[row] = self.spec.columns(starts[row], starts[row] + self.window_size)
+        if self.layout == 'cnn':
+            return windows[..., np.newaxis]
+        return windows.transpose(0, 2, 1)
+
+
+def model_layout(input_shape):
+    # Layout a seismic model expects from its Keras input shape:
+    # (None, freq, window, 1) for the CNN, (None, window, freq) for LSTM/GRU
+    return 'cnn' if len(input_shape) == 4 else 'rnn'
+
+
+def feature_windows(data, window_size=WINDOW_SIZE):
+    # data: (time_slices, features) -> (n, window_size, features)
+    n = data.shape[0] - window_size
+    return sliding_window_view(data, window_size, axis=0)[:n].transpose(0, 2, 1)
+
+
+def half_labels(time_slices):
+    # Placeholder labelling used by the seismic scripts: first half event (1),
+    # second half no event (0)
+    labels = np.zeros(time_slices)
+    labels[:time_slices // 2] = 1
+    return labels
+
+
+def window_labels(labels, window_size=WINDOW_SIZE):
+    # Label of each window is the label of its centre column
+    n = len(labels) - window_size
+    return labels[window_size // 2:window_size // 2 + n]
+
+
+def split_indices(n_windows, test_size=0.2, random_state=42):
+    # Same shuffle as train_test_split(X, y, ...) on the materialised arrays,
+    # but only the window indices are split. Imported here so the servers,
+    # which only need model_layout(), do not load scikit-learn.
+    from sklearn.model_selection import train_test_split
+
+    return train_test_split(np.arange(n_windows), test_size=test_size, random_state=random_state)
+
+
+def take(windows, indices):
+    # Materialise only the selected windows as one contiguous array
+    return np.ascontiguousarray(windows[indices])